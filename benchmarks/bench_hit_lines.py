@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------------
+# Copyright (c) 2015--, microprot development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import os
+import timeit
+from glob import glob
+
+import click
+
+from microprot.scripts.split_search import (_parse_hit_summary_line,
+                                            _parse_hit_summary_fields,
+                                            _parse_stats_fields,
+                                            _STATS_LINE)
+
+
+"""
+Micro-benchmark of the fast paths for hit summary and stats lines of
+HHsearch output against the tolerant, field based parsing they fall back to.
+Reports lines per second, as best of `repeat` timings of `number` rounds over
+all lines of the HHsearch output files (*.out) of a directory.
+"""
+
+
+_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                         'microprot', 'tests', 'data', 'test_split_search')
+
+
+def collect_lines(data_dir):
+    """ Collects hit summary and stats lines of HHsearch output files.
+
+    Parameters
+    ----------
+    data_dir : str
+        Directory of HHsearch output files (*.out).
+
+    Returns
+    -------
+    ([str], [str]) hit summary lines and stats lines of alignment blocks.
+    """
+    summary, stats = [], []
+    for fp in sorted(glob(os.path.join(data_dir, '*.out'))):
+        in_summary = False
+        with open(fp, 'r') as f:
+            for line in f:
+                if line.startswith(' No Hit'):
+                    in_summary = True
+                elif in_summary and line.strip() == '':
+                    in_summary = False
+                elif in_summary:
+                    summary.append(line)
+                elif line.startswith('Probab='):
+                    stats.append(line)
+    return summary, stats
+
+
+def lines_per_second(parse, lines, number=50, repeat=5):
+    """ Best throughput of parse over lines, in lines per second. """
+    seconds = min(timeit.repeat(lambda: [parse(line) for line in lines],
+                                number=number, repeat=repeat))
+    return len(lines) * number / seconds
+
+
+def _parse_stats_line(stats):
+    """ Fast path of _parse_hit_block for the stats line. """
+    match = _STATS_LINE.match(stats)
+    if match is None:
+        return _parse_stats_fields(stats)
+    return match.groups()
+
+
+@click.command()
+@click.argument('data_dir', default=_DATA_DIR,
+                type=click.Path(exists=True, file_okay=False))
+@click.option('--number', '-n', default=50, help='Rounds per timing')
+@click.option('--repeat', '-r', default=5, help='Number of timings')
+def _bench_hit_lines(data_dir, number, repeat):
+    summary, stats = collect_lines(data_dir)
+    print('%i summary and %i stats lines of %s (best of %i x %i rounds)' %
+          (len(summary), len(stats), os.path.normpath(data_dir), repeat,
+           number))
+    for name, lines, fallback, fast in [
+            ('summary lines', summary, _parse_hit_summary_fields,
+             _parse_hit_summary_line),
+            ('stats lines', stats, _parse_stats_fields, _parse_stats_line)]:
+        print('  %-14s %9.0f -> %9.0f lines/s' % (
+              name + ':', lines_per_second(fallback, lines, number, repeat),
+              lines_per_second(fast, lines, number, repeat)))
+
+
+if __name__ == "__main__":
+    _bench_hit_lines()
@@ -1,8 +1,16 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
+import gzip
+import hashlib
+from glob import glob
+from multiprocessing import Pool
+from collections import OrderedDict
+
 import numpy as np
 import click
+from scipy.spatial import cKDTree
 
 
 r'''
@@ -17,6 +25,36 @@ read_PDB_coordinates
     output:
         coords  :   list (4d)
 
+read_PDB_arrays
+---------------
+    input:
+        inp     :   file handle or file path (.gz)
+        aacid   :   str ('HA' for all heavy atoms)
+        chain   :   str
+    output:
+        resids  :   numpy.ndarray (1d)
+        xyz     :   numpy.ndarray (2d)
+        offsets :   numpy.ndarray (1d), only for `aacid` 'HA'
+
+read_PDB_atoms
+--------------
+    input:
+        inp     :   file handle or file path (.gz)
+        chain   :   str
+    output:
+        resids  :   numpy.ndarray (1d)
+        xyz     :   numpy.ndarray (2d)
+        offsets :   numpy.ndarray (1d)
+
+read_PDB_models
+---------------
+    input:
+        inp     :   file handle or file path (.gz)
+        aacid   :   str
+        chain   :   str
+    output:
+        models  :   OrderedDict of chain: (resids, xyz (n_models, n, 3))
+
 read_contact_predictions
 ------------------------
     input:
@@ -30,11 +68,8 @@ read_contact_predictions
 
 find_PDB_contacts
 -----------------
-TODO: add option to calculate HA (heavy atom) contacts
-      (need to re-assess the method to calculate distances)
-
     input:
-        coords      :   list (4d)
+        coords      :   list (4d) or tuple of arrays
         out_fh      :   file handle
         contact_coff:   int
         seq_sep     :   int
@@ -42,6 +77,23 @@ TODO: add option to calculate HA (heavy atom) contacts
     output:
         _contact    :   list (3d - aa1, aa2, dist)
 
+contact_map
+-----------
+    input:
+        pdb_fp      :   str
+        aacid       :   str
+        contact_coff:   int
+        chain       :   str
+        cache_dir   :   str
+    output:
+        resids      :   numpy.ndarray (1d)
+        i, j        :   numpy.ndarray (1d, rows of resids)
+        dist        :   numpy.ndarray (1d)
+
+write_contact_map / read_contact_map
+------------------------------------
+    sparse COO contact map (resids, i, j, dist) as .npz file
+
 contact_precision
 -----------------
     input:
@@ -55,14 +107,85 @@ contact_precision
     output:
         contact_precision   :   float
 
+find_ensemble_contacts
+----------------------
+    input:
+        models      :   tuple (resids, xyz (n_models, n, 3))
+        out_fh      :   file handle
+        contact_coff:   int
+        seq_sep     :   int
+        con_type    :   str
+    output:
+        _contact    :   list (3d - aa1, aa2, fraction of models)
+
+ensemble_precision
+------------------
+    input:
+        models      :   tuple (resids, xyz (n_models, n, 3))
+        pred_cons   :   list (2d)
+        con_coff    :   int
+        minsep      :   int
+        consensus   :   float
+    output:
+        precisions  :   numpy.ndarray (per model)
+        consensus_precision :   float
+
+contact_metrics
+---------------
+    input:
+        coords      :   list (4d)
+        pred_cons   :   list (2d)
+        con_coff    :   int
+        minsep      :   int
+        contype     :   str
+        con_map     :   tuple, see contact_map
+    output:
+        metrics     :   dict (tp, fp, fn, tn, precision, recall, f1, mcc,
+                        fp_distance_error)
+
+precision_table
+---------------
+    input:
+        coords      :   list (4d)
+        inp_fh      :   file handle
+        topLs       :   list of int
+        contypes    :   list of str
+        con_coff    :   int
+        minsep      :   int
+    output:
+        table       :   list of tuples (contype, topL, n, n_true, precision)
+
+batch_precision
+---------------
+    input:
+        coords      :   list (4d)
+        pred_fps    :   list of str
+        topL        :   int
+        contype     :   str
+        con_coff    :   int
+        minsep      :   int
+        aacid       :   str
+        n_jobs      :   int
+    output:
+        summary     :   list of tuples (file, n, n_true, precision)
+
 _contacts
 ---------
 command line interface
 '''
 
 
+# version of the contact map format, part of the key of cached maps
+_CONTACT_MAP_VERSION = 1
+
+
+def _ratio(numerator, denominator):
+    """ numerator / denominator, NaN if the denominator is 0 """
+    return float(numerator) / float(denominator) if denominator else np.nan
+
+
 def _calc_prec(tr, fa):
-    return (float(tr)/(float(tr)+float(fa)))
+    return _ratio(tr, float(tr) + float(fa))
 
 
 def _calc_distance(xA, xB, yA, yB, zA, zB):
@@ -72,7 +195,7 @@ def _calc_distance(xA, xB, yA, yB, zA, zB):
 
 
 def _topN_contacts(coords, topL):
-    return int(len(coords)/float(topL))
+    return int(len(_coords_array(coords)[0])/float(topL))
 
 
 def _contype(contact_type, sequence_sep):
@@ -85,80 +208,355 @@ def _contype(contact_type, sequence_sep):
     elif contact_type == "sr":
         con_min = sequence_sep
         con_max = 23
+    elif contact_type == "mr":
+        con_min = max(sequence_sep, 12)
+        con_max = 23
     else:
-        raise ValueError('contact type should be either `all`, `sr` or `lr`')
+        raise ValueError('contact type should be either `all`, `sr`, `mr` '
+                         'or `lr`')
     return con_min, con_max
 
 
+def _coords_array(coords):
+    """ Splits coordinates into residue numbers and an (n, 3) xyz array.
+
+    Parameters
+    ----------
+    coords : list (4d), numpy.ndarray or tuple of numpy.ndarray
+        Residue number and (x, y, z) coordinates per residue, as returned by
+        read_PDB_coordinates, or residue numbers, coordinates and optionally
+        atom offsets of each residue, as returned by read_PDB_arrays.
+
+    Returns
+    -------
+    (numpy.ndarray, numpy.ndarray, numpy.ndarray) residue numbers (int),
+    coordinates and the offsets of each residue's atoms in the coordinates.
+    Offsets are None for one atom per residue.
+    """
+    if isinstance(coords, tuple) and len(coords) in (2, 3):
+        offsets = coords[2] if len(coords) == 3 else None
+        if offsets is not None:
+            offsets = np.asarray(offsets, dtype=int)
+        return (np.asarray(coords[0], dtype=int),
+                np.asarray(coords[1], dtype=float).reshape(-1, 3),
+                offsets)
+    coords = np.asarray(coords, dtype=float).reshape(-1, 4)
+    return coords[:, 0].astype(int), coords[:, 1:], None
+
+
+def _pair_distances(xyz, offsets, i, j):
+    """ Distances between residues of rows i and j.
+
+    Parameters
+    ----------
+    xyz : numpy.ndarray
+        (n, 3) coordinates.
+    offsets : numpy.ndarray or None
+        Offsets of each residue's atoms in xyz, see read_PDB_atoms, or None
+        for one atom per residue.
+    i, j : numpy.ndarray
+        Residue rows.
+
+    Returns
+    -------
+    numpy.ndarray the distances of the residue atoms, or the minimal
+    distances of any two atoms of the residues.
+    """
+    if offsets is None:
+        return _calc_distance(xyz[i, 0], xyz[j, 0],
+                              xyz[i, 1], xyz[j, 1],
+                              xyz[i, 2], xyz[j, 2])
+
+    # pad residues to the same number of atoms, padding atoms are NaN
+    counts = np.diff(offsets)
+    padded = np.full((len(counts), max(counts.max(initial=0), 1), 3), np.nan)
+    atom_res = np.repeat(np.arange(len(counts)), counts)
+    padded[atom_res, np.arange(len(atom_res)) - offsets[atom_res]] = xyz
+
+    dist = np.empty(len(i))
+    chunk = 4096
+    for start in range(0, len(i), chunk):
+        a = padded[i[start:start + chunk]][:, :, None, :]
+        b = padded[j[start:start + chunk]][:, None, :, :]
+        d = np.sqrt(np.sum(np.power(a - b, 2), axis=3))
+        dist[start:start + chunk] = np.fmin.reduce(
+            d.reshape(len(d), -1), axis=1)
+    return dist
+
+
+def _contact_pairs(resids, xyz, contact_coff=8, con_min=5, con_max=10e9,
+                   offsets=None):
+    """ Finds all residue pairs within a distance cutoff.
+
+    Candidate pairs are found with a KD-tree; their distances are then
+    computed just as by _calc_distance and compared to the cutoff.
+
+    Parameters
+    ----------
+    resids : numpy.ndarray
+        Residue numbers.
+    xyz : numpy.ndarray
+        (n, 3) coordinates, one row per residue, or one row per atom if
+        offsets are given.
+    contact_coff : float
+        Maximal distance of a contact.
+    con_min, con_max : int
+        Window of residue number separation, see _contype. For a pair of rows
+        i < j, resids[j] - resids[i] must be within [con_min, con_max].
+    offsets : numpy.ndarray, optional
+        Offsets of each residue's atoms in xyz, see read_PDB_atoms. Residues
+        are in contact if any two of their atoms are, and their distance is
+        the minimal distance of any two of their atoms.
+
+    Returns
+    -------
+    (numpy.ndarray, numpy.ndarray, numpy.ndarray) residue row indices i and
+    j, and the distances of all contacts, sorted by i, then j.
+    """
+    empty = (np.array([], dtype=int), np.array([], dtype=int),
+             np.array([], dtype=float))
+    if len(xyz) < 2:
+        return empty
+    # slightly widen the search radius to be robust against rounding
+    pairs = cKDTree(xyz).query_pairs(float(contact_coff) * (1 + 1e-9),
+                                     output_type='ndarray')
+    if len(pairs) == 0:
+        return empty
+    pairs.sort(axis=1)
+    i, j = pairs[:, 0], pairs[:, 1]
+
+    # residue rows of the atoms, such that ri <= rj
+    if offsets is None:
+        ri, rj = i, j
+    else:
+        atom_res = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        ri, rj = atom_res[i], atom_res[j]
+
+    sep = resids[rj] - resids[ri]
+    keep = (ri != rj) & (sep >= int(con_min)) & (sep <= int(con_max))
+    i, j, ri, rj = i[keep], j[keep], ri[keep], rj[keep]
+
+    dist = _calc_distance(xyz[i, 0], xyz[j, 0],
+                          xyz[i, 1], xyz[j, 1],
+                          xyz[i, 2], xyz[j, 2])
+    keep = dist <= float(contact_coff)
+    ri, rj, dist = ri[keep], rj[keep], dist[keep]
+
+    # the closest atom pair of each residue pair comes first
+    order = np.lexsort((dist, rj, ri))
+    ri, rj, dist = ri[order], rj[order], dist[order]
+    if offsets is not None:
+        first = np.ones(len(ri), dtype=bool)
+        first[1:] = (ri[1:] != ri[:-1]) | (rj[1:] != rj[:-1])
+        ri, rj, dist = ri[first], rj[first], dist[first]
+    return ri, rj, dist
+
+
+def _atom_names(names):
+    """ Atom names as in columns 13-16 of PDB ATOM records. """
+    # atom names are left aligned, starting in column 14 for one letter
+    # elements
+    names = [name.encode() for name in names]
+    return set([(b' ' + name).ljust(4) for name in names if len(name) < 4] +
+               [name.ljust(4) for name in names])
+
+
+def _read_PDB_data(inp):
+    '''
+    Read the content of PDB file handle or path `inp`, which may be gzip
+    compressed (.gz), as bytes
+    '''
+    if isinstance(inp, str):
+        opener = gzip.open if inp.endswith('.gz') else open
+        with opener(inp, 'rb') as inp_fh:
+            data = inp_fh.read()
+    else:
+        data = inp.read()
+    if isinstance(data, str):
+        data = data.encode()
+    return data
+
+
+def _first_model(data):
+    '''
+    The records of the first MODEL of PDB content `data`, or all of `data` if
+    it holds no MODEL records
+    '''
+    blocks = (b'\n' + data).split(b'\nMODEL ', 2)
+    if len(blocks) == 1:
+        return data
+    return blocks[1].split(b'\nENDMDL', 1)[0]
+
+
+def _is_hydrogen(line):
+    '''
+    Whether ATOM record `line` is a hydrogen (or deuterium) atom, by its
+    element symbol in columns 77-78 or else by its atom name
+    '''
+    element = line[76:78].strip()
+    if not element:
+        element = line[12:16].strip().lstrip(b'0123456789')[:1]
+    return element in (b'H', b'D')
+
+
+def read_PDB_atoms(inp, chain=None):
+    '''
+    Read PDB coordinates of all heavy atoms from ATOM records of `inp`, a file
+    handle or path, which may be gzip compressed (.gz). Only atoms of `chain`,
+    if given, and of the first MODEL are read. Consecutive records of the
+    same chain, residue number and insertion code make up one residue.
+    Returns residue numbers, an (n_atoms, 3) array of (x, y, z) coordinates
+    and the offsets of each residue's atoms, such that the atoms of the i-th
+    residue are xyz[offsets[i]:offsets[i+1]].
+    '''
+    data = _first_model(_read_PDB_data(inp))
+    chain = None if chain is None else chain.encode()
+    records = [(line[21:27], line[22:26],
+                line[30:38], line[38:46], line[46:54])
+               for line in data.split(b'\n')
+               if line.startswith(b'ATOM  ') and not _is_hydrogen(line) and
+               ((chain is None) or (line[21:22] == chain))]
+
+    if len(records) == 0:
+        return (np.array([], dtype=int), np.zeros((0, 3)),
+                np.zeros(1, dtype=int))
+    records = np.array(records)
+    keys = records[:, 0]
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    offsets = np.append(starts, len(records))
+    return (records[starts, 1].astype(int), records[:, 2:].astype(float),
+            offsets)
+
+
+def read_PDB_arrays(inp, aacid='CB', chain=None):
+    '''
+    Read PDB coordinates of `aacid` atoms (CA for glycines) from ATOM records
+    of `inp`, a file handle or path, which may be gzip compressed (.gz).
+    Records are parsed by the fixed PDB column layout, such that fused
+    columns are read correctly. Only atoms of `chain` are read, if given.
+    Of ensembles, e.g. NMR models, only the first MODEL is read, see
+    read_PDB_models for all models.
+    Returns residue numbers and an (n, 3) array of (x, y, z) coordinates.
+    For `aacid` 'HA' all heavy atoms are read, see read_PDB_atoms.
+    '''
+    if aacid == 'HA':
+        return read_PDB_atoms(inp, chain)
+    records = _atom_records(_first_model(_read_PDB_data(inp)), aacid, chain)
+    return records[:, 1].astype(int), records[:, 2:].astype(float)
+
+
+def _atom_records(data, aacid='CB', chain=None):
+    '''
+    Parse ATOM records of `aacid` atoms (CA for glycines) of `chain`, or of
+    all chains, from PDB content `data` into an array of byte strings with
+    columns chain, residue number, x, y and z
+    '''
+    # fixed columns: atom name 13-16, residue name 18-20, chain 22,
+    # residue number 23-26, x 31-38, y 39-46, z 47-54
+    names = _atom_names([aacid, 'CA'])
+    aacid, gly = _atom_names([aacid]), _atom_names(['CA'])
+    chain = None if chain is None else chain.encode()
+    records = [(line[21:22], line[22:26],
+                line[30:38], line[38:46], line[46:54])
+               for line in data.split(b'\n')
+               if line.startswith(b'ATOM  ') and (line[12:16] in names) and
+               (line[12:16] in (gly if line[17:20] == b'GLY' else aacid)) and
+               ((chain is None) or (line[21:22] == chain))]
+    return np.array(records, dtype=bytes).reshape(-1, 5)
+
+
+def read_PDB_models(inp, aacid='CB', chain=None):
+    '''
+    Read PDB coordinates of `aacid` atoms (CA for glycines) of every MODEL of
+    `inp`, a file handle or path, which may be gzip compressed (.gz), see
+    read_PDB_arrays. Files without MODEL records hold a single model.
+    Returns an OrderedDict of residue numbers and an (n_models, n, 3) array
+    of (x, y, z) coordinates for each chain, or only for `chain` if given.
+    Raises ValueError if the models of a chain differ in their residues.
+    '''
+    if aacid == 'HA':
+        raise ValueError('Models are read with one atom per residue.')
+    blocks = (b'\n' + _read_PDB_data(inp)).split(b'\nMODEL ')
+    if len(blocks) > 1:
+        # drop the header before the first model
+        blocks = blocks[1:]
+    models = [_atom_records(block, aacid, chain) for block in blocks]
+
+    chains = OrderedDict()
+    for record_chain in OrderedDict.fromkeys(models[0][:, 0]):
+        records = [records[records[:, 0] == record_chain]
+                   for records in models]
+        resids = records[0][:, 1]
+        for model in records[1:]:
+            if not np.array_equal(model[:, 1], resids):
+                raise ValueError('Models differ in residues of chain "%s".'
+                                 % record_chain.decode())
+        chains[record_chain.decode()] = (
+            resids.astype(int),
+            np.array([model[:, 2:] for model in records]).astype(float))
+    return chains
+
+
 def read_PDB_coordinates(inp_fh, aacid='CB'):
     '''
     Read PDB coordinates from ATOM recuds in a `inp_fh` file.
     Returns a 4D list of coordinates with residue number
     and (x, y, z) coordinates.
     '''
-    coords = []
-    lines = inp_fh.readlines()
-    for i in lines:
-        line = i.split()
-        if line[0] == 'ATOM' and aacid == line[2] \
-           and line[3] != 'GLY':
-            if i[21] != ' ':
-                coords.append([int(line[5]),
-                               float(line[6]),
-                               float(line[7]),
-                               float(line[8])])
-            else:
-                coords.append([int(line[4]),
-                               float(line[5]),
-                               float(line[6]),
-                               float(line[7])])
-        elif line[0] == 'ATOM' and line[2] == 'CA' and line[3] == 'GLY':
-            if i[21] != ' ':
-                coords.append([int(line[5]),
-                               float(line[6]),
-                               float(line[7]),
-                               float(line[8])])
-            else:
-                coords.append([int(line[4]),
-                               float(line[5]),
-                               float(line[6]),
-                               float(line[7])])
-    return coords
+    if aacid == 'HA':
+        raise ValueError('Heavy atom coordinates are read by '
+                         'read_PDB_arrays or read_PDB_atoms.')
+    resids, xyz = read_PDB_arrays(inp_fh, aacid)
+    return [[resid, x, y, z]
+            for resid, (x, y, z) in zip(resids.tolist(), xyz.tolist())]
 
 
-def read_contact_predictions(inp_fh, topX=1e10, contype='all', min_sep=5):
+def _read_RR(inp_fh):
     '''
-    Read `topx` predicted contacts of type `contype` from `inp_fp`
-    and return lists of interacting residues `aacids` and predicted PPVs `ppv`
+    Read all predicted contacts from PFRMAT RR file handle `inp_fh` and
+    return an (n, 2) array of residue numbers and an array of predicted PPVs
+    in file order
     '''
-
-    lines = inp_fh.readlines()[0:]
-
     # make sure it's a PFRMAT RR file
-    if not lines[0].startswith('PFRMAT RR'):
+    if not inp_fh.readline().startswith('PFRMAT RR'):
         raise ValueError('Contacts file is not in PFRMAT (CASP) format!')
 
-    contype_coff, contype_max = _contype(contype, min_sep)
+    # parse the remaining lines straight into numbers, chunk by chunk
+    contacts = np.loadtxt(inp_fh, usecols=(0, 1, 4), ndmin=2)
+    return contacts[:, :2].astype(int), contacts[:, 2]
+
 
-    contacts = []
+def _ranked_by_ppv(ppv, topX=None):
+    '''
+    Indices of the `topX` highest predicted PPVs `ppv`, ordered from highest
+    to lowest. Only the selected PPVs are sorted.
+    '''
+    if topX is None or topX >= len(ppv):
+        return np.argsort(ppv)[::-1]
+    topX = max(int(topX), 0)
+    if topX == 0:
+        return np.array([], dtype=int)
+    top = np.argpartition(ppv, len(ppv) - topX)[len(ppv) - topX:]
+    return top[np.argsort(ppv[top])[::-1]]
 
-    for i in lines:
-        line = i.split()
-        if i.startswith("PFRMAT"):
-            continue
-        if (abs(int(line[1]) - int(line[0])) >= contype_coff) and \
-           (abs(int(line[0]) - int(line[1])) <= contype_max):
-            contacts.append([line[0], line[1], line[4]])
 
-    contacts = np.array(contacts)
+def read_contact_predictions(inp_fh, topX=1e10, contype='all', min_sep=5):
+    '''
+    Read `topx` predicted contacts of type `contype` from `inp_fp`
+    and return lists of interacting residues `aacids` and predicted PPVs `ppv`
+    '''
+    pairs, ppv = _read_RR(inp_fh)
 
-    # sort contacts list by predicted probability
-    contacts_sorted = contacts[np.argsort(contacts[:, 2].astype(float))][::-1]
+    contype_coff, contype_max = _contype(contype, min_sep)
+    sep = np.abs(pairs[:, 1] - pairs[:, 0])
+    sel = (sep >= contype_coff) & (sep <= contype_max)
+    pairs, ppv = pairs[sel], ppv[sel]
 
-    topX_contacts = contacts_sorted[0:int(topX)]
+    # select and sort the top contacts by predicted probability
+    order = _ranked_by_ppv(ppv, topX)
 
-    aacids = topX_contacts[:, 0:2].astype(int).tolist()
-    ppv = topX_contacts[:, 2].astype(float).tolist()
+    aacids = pairs[order].tolist()
+    ppv = ppv[order].tolist()
 
     # return aminoacids (AA1 and AA2 values) and predicted PPV values
     return aacids, ppv
@@ -174,25 +572,202 @@ def find_PDB_contacts(coords, out_fh=None,
     '''
     con_min, con_max = _contype(con_type, seq_sep)
 
-    # calc distances
-    for i in range(len(coords)):
-        actual = coords[i][0]
-        for j in coords[i:]:
-            if (j[0] >= actual + int(con_min)) and \
-               (j[0] <= actual + int(con_max)):
-                distance = _calc_distance(coords[i][1], j[1],
-                                          coords[i][2], j[2],
-                                          coords[i][3], j[3])
-                if distance <= float(contact_coff):
-                    _contact = (str(actual), str(j[0]), float(distance))
-                    _con_fmt = '%s\t%s\t%.4f\n' % _contact
-                    if out_fh:
-                        out_fh.write(_con_fmt)
-                    else:
-                        yield _contact
-        actual = []
+    resids, xyz, offsets = _coords_array(coords)
+    i, j, dist = _contact_pairs(resids, xyz, contact_coff, con_min, con_max,
+                                offsets)
+    contacts = _contact_tuples(resids, i, j, dist)
+
     if out_fh:
+        out_fh.write(''.join('%s\t%s\t%.4f\n' % _contact
+                             for _contact in contacts))
         out_fh.close()
+    else:
+        for _contact in contacts:
+            yield _contact
+
+
+def _contact_tuples(resids, i, j, dist):
+    '''
+    Contacts as tuples of residue numbers (str) and distance
+    '''
+    return zip(resids[i].astype(str).tolist(),
+               resids[j].astype(str).tolist(),
+               dist.tolist())
+
+
+def write_contact_map(out_fp, resids, i, j, dist):
+    '''
+    Write a contact map as a sparse COO matrix, i.e. residue numbers `resids`
+    and row indices `i`, `j` and distances `dist` of the contacts, into a
+    compressed .npz file `out_fp`, a file path or binary file handle
+    '''
+    if isinstance(out_fp, str):
+        # keep the file name, numpy would append .npz
+        with open(out_fp, 'wb') as out_fh:
+            return write_contact_map(out_fh, resids, i, j, dist)
+    np.savez_compressed(out_fp, resids=np.asarray(resids, dtype=np.int32),
+                        i=np.asarray(i, dtype=np.int32),
+                        j=np.asarray(j, dtype=np.int32),
+                        dist=np.asarray(dist, dtype=np.float64))
+
+
+def read_contact_map(inp_fp):
+    '''
+    Read a contact map written by write_contact_map.
+    Returns residue numbers, row indices i and j, and distances of contacts.
+    '''
+    with np.load(inp_fp) as data:
+        return (data['resids'].astype(int), data['i'].astype(int),
+                data['j'].astype(int), data['dist'])
+
+
+def _contact_map_key(pdb_fp, aacid, contact_coff, chain):
+    '''
+    Key of the cached contact map of `pdb_fp`, from its absolute path,
+    size and modification time, the atom type, cutoff and chain
+    '''
+    try:
+        stat = os.stat(pdb_fp)
+    except OSError:
+        raise IOError('Cannot read file "%s"' % pdb_fp)
+    key = '%i\t%s\t%i\t%i\t%s\t%r\t%s' % (
+        _CONTACT_MAP_VERSION, os.path.abspath(pdb_fp), stat.st_size,
+        stat.st_mtime_ns, aacid, float(contact_coff), chain)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def contact_map(pdb_fp, aacid='CB', contact_coff=8, chain=None,
+                cache_dir=None):
+    '''
+    Find all contacts of residues within `contact_coff` in PDB file `pdb_fp`,
+    regardless of their sequence separation, for `aacid` atoms (or HA for
+    heavy atoms) of `chain`, if given.
+    If `cache_dir` is given, the contact map is loaded from there if it was
+    computed before for the same file, atom type, cutoff and chain, and
+    stored there otherwise.
+    Returns residue numbers, row indices i and j, and distances of contacts,
+    sorted by i, then j.
+    '''
+    if cache_dir is not None:
+        fp = os.path.join(cache_dir, '%s.npz' % _contact_map_key(
+            pdb_fp, aacid, contact_coff, chain))
+        try:
+            return read_contact_map(fp)
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+
+    resids, xyz, offsets = _coords_array(read_PDB_arrays(pdb_fp, aacid,
+                                                         chain))
+    i, j, dist = _contact_pairs(resids, xyz, contact_coff, -10e9, 10e9,
+                                offsets)
+
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        # write to a temporary file first, such that concurrent processes
+        # never read partially written maps
+        tmp_fp = '%s.%i.tmp' % (fp, os.getpid())
+        write_contact_map(tmp_fp, resids, i, j, dist)
+        os.replace(tmp_fp, fp)
+    return resids, i, j, dist
+
+
+def _contact_window(resids, i, j, dist, con_min, con_max):
+    '''
+    Contacts `i`, `j`, `dist` of a contact map whose residue numbers are
+    separated by `con_min` to `con_max`
+    '''
+    sep = resids[j] - resids[i]
+    keep = (sep >= int(con_min)) & (sep <= int(con_max))
+    return i[keep], j[keep], dist[keep]
+
+
+def _residue_rows(resids, numbers):
+    """ Looks up the rows of residue numbers in a structure.
+
+    Parameters
+    ----------
+    resids : numpy.ndarray
+        Residue numbers of the structure, one per row. Residue numbers may
+        have gaps and need not start at 1. If a residue number repeats, e.g.
+        for insertion codes, its first row is used.
+    numbers : numpy.ndarray
+        Residue numbers to look up.
+
+    Returns
+    -------
+    numpy.ndarray rows of numbers in the structure, -1 for residues missing
+    from the structure.
+    """
+    numbers = np.asarray(numbers, dtype=int)
+    rows = np.full(numbers.shape, -1, dtype=int)
+    if len(resids) == 0:
+        return rows
+
+    # dense index from residue number - first residue number to first row
+    first, last = resids.min(), resids.max()
+    index = np.full(last - first + 1, -1, dtype=int)
+    unique, first_rows = np.unique(resids, return_index=True)
+    index[unique - first] = first_rows
+
+    inside = (numbers >= first) & (numbers <= last)
+    rows[inside] = index[numbers[inside] - first]
+    return rows
+
+
+def _contact_status(coords, pairs, con_coff=8, minsep=5):
+    """ Evaluates predicted contacts against a structure.
+
+    Parameters
+    ----------
+    coords : list (4d) or tuple of numpy.ndarray
+        Coordinates of the structure, see _coords_array. Residues are looked
+        up by their residue number, see _residue_rows.
+    pairs : numpy.ndarray
+        (n, 2) residue numbers of the predicted contacts.
+    con_coff : float
+        Maximal distance of a true contact.
+    minsep : int
+        Minimal sequence separation of a pair to be evaluated.
+
+    Returns
+    -------
+    (numpy.ndarray, numpy.ndarray, numpy.ndarray) a boolean mask of the
+    pairs far enough apart and, for those pairs, whether they are true or
+    false contacts. Pairs of residues missing from the structure are neither
+    true nor false contacts.
+    """
+    sel, distance = _predicted_distances(coords, pairs, minsep)
+    return sel, distance <= float(con_coff), distance > float(con_coff)
+
+
+def _predicted_distances(coords, pairs, minsep=5):
+    """ Distances of predicted contacts in a structure.
+
+    Parameters
+    ----------
+    coords : list (4d) or tuple of numpy.ndarray
+        Coordinates of the structure, see _contact_status.
+    pairs : numpy.ndarray
+        (n, 2) residue numbers of the predicted contacts.
+    minsep : int
+        Minimal sequence separation of a pair to be evaluated.
+
+    Returns
+    -------
+    (numpy.ndarray, numpy.ndarray) a boolean mask of the pairs far enough
+    apart and, for those pairs, their distances, NaN for pairs of residues
+    missing from the structure.
+    """
+    resids, xyz, offsets = _coords_array(coords)
+
+    # gather coordinates of all pairs that are far enough apart at once
+    sel = np.abs(pairs[:, 0] - pairs[:, 1]) >= minsep
+    rows = _residue_rows(resids, pairs[sel])
+    present = (rows >= 0).all(axis=1)
+    distance = np.full(len(rows), np.nan)
+    distance[present] = _pair_distances(xyz, offsets, rows[present, 0],
+                                        rows[present, 1])
+    return sel, distance
 
 
 def contact_precision(coords, pred_cons, pred_ppv, out_fh=None, con_coff=8,
@@ -201,51 +776,357 @@ def contact_precision(coords, pred_cons, pred_ppv, out_fh=None, con_coff=8,
     Calculates contact precision (float) for `coords` using `pred cons` list
     and `pred_ppv` predicted probability values.
     Optionally, the function can annotate the contact predictions with TRUE or
-    FALSE values and write to file `out_fh` and/or print to StdOut
-    (verbose flag)
-    '''
-    # starting true and false values
-    true_con = 0
-    false_con = 0
-
-    # calc distances
-    for i, AAs in enumerate(pred_cons):
-        aa1, aa2 = AAs
-        if abs(aa1-aa2) >= minsep:
-                distance = _calc_distance(coords[aa1-1][1], coords[aa2-1][1],
-                                          coords[aa1-1][2], coords[aa2-1][2],
-                                          coords[aa1-1][3], coords[aa2-1][3])
-                if distance <= float(con_coff):
-                    # write output only if provided
-                    output = ('%s\t%s\t%.4f\t%s' %
-                              (aa1, aa2, pred_ppv[i], 'TRUE'))
-                    if out_fh:
-                        out_fh.write(output+'\n')
-                    if verbose:
-                        print(output)
-                    true_con += 1
-                elif distance > float(con_coff):
-                    output = ('%s\t%s\t%.4f\t%s' %
-                              (aa1, aa2, pred_ppv[i], 'FALSE'))
-                    if out_fh:
-                        out_fh.write(output+'\n')
-                    if verbose:
-                        print(output)
-                    false_con += 1
+    FALSE values, or MISSING for residues missing from the structure, and
+    write to file `out_fh` and/or print to StdOut (verbose flag)
+    '''
+    pairs = np.asarray(pred_cons, dtype=int).reshape(-1, 2)
+    ppvs = np.asarray(pred_ppv, dtype=float)
+    sel, true_con, false_con = _contact_status(coords, pairs, con_coff,
+                                               minsep)
+    pairs, ppvs = pairs[sel], ppvs[sel]
+
+    # annotate predictions only if there is an output
+    if out_fh or verbose:
+        labels = np.where(true_con, 'TRUE',
+                          np.where(false_con, 'FALSE', 'MISSING')).tolist()
+        output = ['%s\t%s\t%.4f\t%s' % line
+                  for line in zip(
+                      pairs[:, 0].tolist(),
+                      pairs[:, 1].tolist(),
+                      ppvs.tolist(),
+                      labels)]
+        if out_fh:
+            out_fh.write(''.join('%s\n' % line for line in output))
+        if verbose:
+            for line in output:
+                print(line)
+    if out_fh:
+        out_fh.close()
+    return _calc_prec(int(np.sum(true_con)), int(np.sum(false_con)))
+
+
+def _n_residue_pairs(resids, con_min, con_max):
+    '''
+    Number of pairs of residue numbers `resids` separated by `con_min` to
+    `con_max`, with `con_min` > 0
+    '''
+    resids = np.unique(resids)
+    return int(np.sum(np.searchsorted(resids, resids + con_max, 'right') -
+                      np.searchsorted(resids, resids + con_min, 'left')))
+
+
+def contact_metrics(coords, pred_cons, con_coff=8, minsep=5, contype='all',
+                    con_map=None):
+    '''
+    Evaluate predicted contacts `pred_cons` of type `contype` against the
+    contacts of structure `coords` within `con_coff`, at least `minsep`
+    residues apart. The true contacts of the structure are found once, or
+    taken from contact map `con_map` of the structure, see contact_map.
+    Distances of the predicted pairs are computed once. Repeated pairs are
+    evaluated once, pairs of other contact types or of residues missing from
+    the structure are not evaluated.
+    Returns a dict of the numbers of true and false positives and negatives
+    ('tp', 'fp', 'fn', 'tn'), 'precision', 'recall', 'f1', 'mcc' and
+    'fp_distance_error', the mean distance of false positives beyond
+    `con_coff`. Metrics with a denominator of zero are NaN.
+    '''
+    con_min, con_max = _contype(contype, minsep)
+    con_min = max(con_min, minsep, 1)
+    resids, xyz, offsets = _coords_array(coords)
+
+    # true contacts of the structure, as residue number pairs
+    if con_map is None:
+        map_resids = resids
+        i, j, _ = _contact_pairs(resids, xyz, con_coff, con_min, con_max,
+                                 offsets)
+    else:
+        map_resids = con_map[0]
+        i, j, _ = _contact_window(*con_map, con_min=con_min, con_max=con_max)
+    true_pairs = np.unique(np.column_stack((map_resids[i], map_resids[j])),
+                           axis=0)
+
+    # predicted pairs of the contact type, each pair once
+    pairs = np.sort(np.asarray(pred_cons, dtype=int).reshape(-1, 2), axis=1)
+    sep = pairs[:, 1] - pairs[:, 0]
+    pairs = np.unique(pairs[(sep >= con_min) & (sep <= con_max)], axis=0)
+    _, distance = _predicted_distances((resids, xyz, offsets), pairs, con_min)
+    evaluated = ~np.isnan(distance)
+    distance = distance[evaluated]
+
+    tp = int(np.sum(distance <= float(con_coff)))
+    fp = int(np.sum(distance > float(con_coff)))
+    fn = max(len(true_pairs) - tp, 0)
+    tn = _n_residue_pairs(resids, con_min, con_max) - tp - fp - fn
+    mcc_denominator = np.sqrt(float(tp + fp) * (tp + fn) * (tn + fp) *
+                              (tn + fn))
+    return {'tp': tp, 'fp': fp, 'fn': fn, 'tn': tn,
+            'precision': _ratio(tp, tp + fp),
+            'recall': _ratio(tp, tp + fn),
+            'f1': _ratio(2 * tp, 2 * tp + fp + fn),
+            'mcc': _ratio(float(tp) * tn - float(fp) * fn, mcc_denominator),
+            'fp_distance_error': float(np.mean(
+                distance[distance > float(con_coff)] - float(con_coff)))
+            if fp else np.nan}
+
+
+def _ensemble_contact_pairs(resids, xyz, contact_coff=8, con_min=5,
+                            con_max=10e9):
+    """ Finds all residue pairs within a distance cutoff in any model.
+
+    The models are placed side by side, such that atoms of different models
+    are never within the cutoff, and candidate pairs of all models are found
+    with one KD-tree. Distances are then computed for all models at once.
+
+    Parameters
+    ----------
+    resids : numpy.ndarray
+        Residue numbers.
+    xyz : numpy.ndarray
+        (n_models, n, 3) coordinates, one row per residue and model.
+    contact_coff : float
+        Maximal distance of a contact.
+    con_min, con_max : int
+        Window of residue number separation, see _contact_pairs.
+
+    Returns
+    -------
+    (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray) row indices
+    i and j of residue pairs in contact in any model, sorted by i, then j,
+    and (n_models, n_pairs) arrays of the pairs' distances and whether they
+    are in contact in each model.
+    """
+    n_models, n = xyz.shape[:2]
+    if n < 2:
+        return (np.array([], dtype=int), np.array([], dtype=int),
+                np.zeros((n_models, 0)), np.zeros((n_models, 0), dtype=bool))
+
+    span = np.ptp(xyz[:, :, 0]) + 2 * float(contact_coff) + 1
+    shifted = xyz.copy()
+    shifted[:, :, 0] += span * np.arange(n_models)[:, None]
+    # slightly widen the search radius to be robust against rounding
+    pairs = cKDTree(shifted.reshape(-1, 3)).query_pairs(
+        float(contact_coff) * (1 + 1e-9), output_type='ndarray')
+    pairs = np.unique(np.sort(pairs % n, axis=1).dot([n, 1]))
+    i, j = pairs // n, pairs % n
+
+    sep = resids[j] - resids[i]
+    keep = (sep >= int(con_min)) & (sep <= int(con_max))
+    i, j = i[keep], j[keep]
+
+    dist = _calc_distance(xyz[:, i, 0], xyz[:, j, 0],
+                          xyz[:, i, 1], xyz[:, j, 1],
+                          xyz[:, i, 2], xyz[:, j, 2])
+    in_contact = dist <= float(contact_coff)
+    keep = in_contact.any(axis=0)
+    return i[keep], j[keep], dist[:, keep], in_contact[:, keep]
+
+
+def find_ensemble_contacts(models, out_fh=None,
+                           contact_coff=8, seq_sep=5, con_type='all'):
+    '''
+    for `models`, residue numbers and coordinates of all models as returned
+    by read_PDB_models, find contacts that are within `contact_coff` at least
+    `seq_sep` residues apart in any model, with the fraction of models they
+    are found in.
+    If `out_fh` is provided, write the resuls to file.
+    If not, return a generator.
+    '''
+    con_min, con_max = _contype(con_type, seq_sep)
+
+    resids, xyz = models
+    resids, xyz = np.asarray(resids, dtype=int), np.asarray(xyz, dtype=float)
+    i, j, _, in_contact = _ensemble_contact_pairs(resids, xyz, contact_coff,
+                                                  con_min, con_max)
+    contacts = zip(resids[i].astype(str).tolist(),
+                   resids[j].astype(str).tolist(),
+                   in_contact.mean(axis=0).tolist())
+
     if out_fh:
+        out_fh.write(''.join('%s\t%s\t%.4f\n' % _contact
+                             for _contact in contacts))
         out_fh.close()
-    return _calc_prec(true_con, false_con)
+    else:
+        for _contact in contacts:
+            yield _contact
+
+
+def ensemble_precision(models, pred_cons, con_coff=8, minsep=5,
+                       consensus=0.5):
+    '''
+    Calculate contact precision of `pred_cons` for each of `models`, residue
+    numbers and coordinates of all models as returned by read_PDB_models,
+    evaluating all models at once. A predicted contact is true for the
+    consensus of the models if it is found in at least a fraction
+    `consensus` of the models. Pairs of residues missing from the models are
+    not evaluated.
+    Returns an array of precisions per model and the consensus precision
+    (NaN if no contact was evaluated).
+    '''
+    resids = np.asarray(models[0], dtype=int)
+    xyz = np.asarray(models[1], dtype=float)
+    pairs = np.asarray(pred_cons, dtype=int).reshape(-1, 2)
+
+    # pairs of residues missing from the models are not evaluated
+    sel = np.abs(pairs[:, 0] - pairs[:, 1]) >= minsep
+    rows = _residue_rows(resids, pairs[sel])
+    rows = rows[(rows >= 0).all(axis=1)]
+    aa1, aa2 = rows[:, 0], rows[:, 1]
+    distance = _calc_distance(xyz[:, aa1, 0], xyz[:, aa2, 0],
+                              xyz[:, aa1, 1], xyz[:, aa2, 1],
+                              xyz[:, aa1, 2], xyz[:, aa2, 2])
+    true_con = distance <= float(con_coff)
+
+    if true_con.shape[1] == 0:
+        return np.full(len(xyz), np.nan), np.nan
+    frequency = true_con.mean(axis=0)
+    return true_con.mean(axis=1), float(np.mean(frequency >= consensus))
+
+
+def precision_table(coords, inp_fh, topLs=(10, 5, 2, 1),
+                    contypes=('all', 'sr', 'lr'), con_coff=8, minsep=5):
+    '''
+    Calculate contact precision of the predictions in RR file handle `inp_fh`
+    for all top-L fractions `topLs` and contact types `contypes` at once.
+    Predictions are read and ranked once and each contact is evaluated once,
+    precisions follow from cumulative counts of true contacts.
+    Returns one row per contact type and top-L fraction: contact type, topL,
+    number of evaluated contacts, number of true contacts and precision
+    (NaN if no contact was evaluated).
+    '''
+    pairs, ppv = _read_RR(inp_fh)
+    order = _ranked_by_ppv(ppv)
+    pairs = pairs[order]
+
+    sel, true_con, false_con = _contact_status(coords, pairs, con_coff,
+                                               minsep)
+    is_true = np.zeros(len(pairs), dtype=bool)
+    is_true[sel] = true_con
+    evaluated = np.zeros(len(pairs), dtype=bool)
+    evaluated[sel] = true_con | false_con
+
+    sep = np.abs(pairs[:, 1] - pairs[:, 0])
+    table = []
+    for contype in contypes:
+        con_min, con_max = _contype(contype, minsep)
+        window = (sep >= con_min) & (sep <= con_max)
+        # number of evaluated and true contacts among the top k of the type
+        n_eval = np.concatenate(([0], np.cumsum(evaluated[window])))
+        n_true = np.concatenate(([0], np.cumsum(is_true[window])))
+        for topL in topLs:
+            k = min(_topN_contacts(coords, topL), len(n_eval) - 1)
+            n = int(n_eval[k])
+            table.append((contype, topL, n, int(n_true[k]),
+                          n_true[k] / float(n) if n > 0 else np.nan))
+    return table
+
+
+def _is_PDB_file(filepath):
+    return filepath.endswith(('.pdb', '.ent', '.pdb.gz', '.ent.gz'))
+
+
+def _is_RR_file(filepath):
+    '''
+    Whether `filepath` is a PFRMAT RR file, by its first line
+    '''
+    try:
+        with open(filepath, 'rb') as f:
+            return f.readline().startswith(b'PFRMAT RR')
+    except (IOError, OSError):
+        return False
+
+
+def find_prediction_files(path):
+    '''
+    Collect contact prediction files, i.e. RR files or decoy PDB files, from
+    directory `path` or from a manifest file `path` listing one filepath per
+    line. Of directories, only PDB files (by extension) and RR files (by their
+    PFRMAT RR header) are collected, other files are skipped.
+    Returns a sorted list for directories, the manifest order otherwise.
+    '''
+    if os.path.isdir(path):
+        return sorted(fp for fp in glob(os.path.join(path, '*'))
+                      if os.path.isfile(fp) and
+                      (_is_PDB_file(fp) or _is_RR_file(fp)))
+    with open(path, 'r') as f:
+        return [line.strip() for line in f
+                if line.strip() and not line.startswith('#')]
+
+
+def _evaluate_prediction(args):
+    '''
+    Evaluate one RR file or decoy PDB file against reference `coords` and
+    return the file path, number of evaluated and of true contacts.
+    Contacts of a decoy are ranked by distance.
+    '''
+    pred_fp, coords, topN, contype, con_coff, minsep, aacid = args
+    if _is_PDB_file(pred_fp):
+        con_min, con_max = _contype(contype, minsep)
+        resids, xyz, offsets = _coords_array(read_PDB_arrays(pred_fp, aacid))
+        i, j, dist = _contact_pairs(resids, xyz, con_coff, con_min, con_max,
+                                    offsets)
+        order = np.argsort(dist, kind='mergesort')[:int(topN)]
+        pairs = np.column_stack((resids[i[order]], resids[j[order]]))
+    else:
+        with open(pred_fp, 'r') as inp_fh:
+            pairs, _ = read_contact_predictions(inp_fh, topN, contype,
+                                                minsep)
+        pairs = np.asarray(pairs, dtype=int).reshape(-1, 2)
+    sel, true_con, false_con = _contact_status(coords, pairs, con_coff,
+                                               minsep)
+    n_true, n_false = int(np.sum(true_con)), int(np.sum(false_con))
+    return pred_fp, n_true + n_false, n_true
+
+
+def batch_precision(coords, pred_fps, topL=1, contype='all', con_coff=8,
+                    minsep=5, aacid='CB', n_jobs=1):
+    '''
+    Calculate contact precision of many predictions `pred_fps`, either RR
+    files or decoy PDB files, against one structure `coords`, which is read
+    only once. Files are evaluated by `n_jobs` worker processes.
+    Returns one summary row per file: file path, number of evaluated
+    contacts, number of true contacts and precision (NaN if no contact was
+    evaluated).
+    '''
+    coords = _coords_array(coords)
+    topN = _topN_contacts(coords, topL)
+    tasks = [(pred_fp, coords, topN, contype, con_coff, minsep, aacid)
+             for pred_fp in pred_fps]
+    if n_jobs > 1:
+        with Pool(n_jobs) as pool:
+            results = pool.map(_evaluate_prediction, tasks)
+    else:
+        results = list(map(_evaluate_prediction, tasks))
+    return [(pred_fp, n, n_true, n_true / float(n) if n > 0 else np.nan)
+            for pred_fp, n, n_true in results]
+
+
+def write_summary(summary, out_fh):
+    '''
+    Write the summary rows of `batch_precision` as a tab separated table.
+    '''
+    out_fh.write('file\tn_contacts\tn_true\tprecision\n')
+    out_fh.write(''.join('%s\t%i\t%i\t%.4f\n' % row for row in summary))
 
 
 # RUN FROM COMMAND LINE
 @click.command()
 @click.option('--mode', default='precision',
-              type=click.Choice(['precision', 'find']),
+              type=click.Choice(['precision', 'metrics', 'find', 'batch',
+                                 'table', 'ensemble']),
               help='Run mode: \n \
                     precision - calculate contact precision \n \
-                    find - find contacts in a PDB file')
+                    metrics - calculate contact precision, recall, F1, MCC \
+                    and distance error of false positives \n \
+                    table - calculate contact precision of top-L/10, L/5, \
+                    L/2 and L contacts of all contact types \n \
+                    ensemble - calculate contact precision for each model \
+                    of an ensemble, e.g. NMR models, and their consensus \n \
+                    find - find contacts in a PDB file \n \
+                    batch - calculate contact precision of all RR or \
+                    decoy PDB files of directory or manifest CONFILE')
 @click.option('--aminoacid', '-a', default='CB',
-              help='Contact atom (CA, CB, etc.)')
+              help='Contact atom (CA, CB, etc.), or HA for contacts of any '
+                   'heavy atoms')
 @click.option('--cutoff', '-c', default=8,
               help='Contact distance cutoff')
 @click.option('--minsep', '-s', default=5,
@@ -253,20 +1134,35 @@ def contact_precision(coords, pred_cons, pred_ppv, out_fh=None, con_coff=8,
 @click.option('--topl', '-l', default=1,
               help='Top-L/x contacts')
 @click.option('--contype', '-t', default='all',
-              type=click.Choice(['all', 'sr', 'lr']),
-              help='Type of contacts (all OR short-range OR long-range)')
+              type=click.Choice(['all', 'sr', 'mr', 'lr']),
+              help='Type of contacts (all OR short-range OR medium-range OR '
+                   'long-range)')
+@click.option('--chain', default=None,
+              help='Chain identifier to read from the PDB file')
+@click.option('--format', 'fmt', default='text',
+              type=click.Choice(['text', 'npz']),
+              help='Format of contacts written to OUTFILE in find mode: \
+                    tab separated text, or a sparse (COO) contact map as \
+                    compressed NumPy archive')
+@click.option('--cache_dir', default=None, type=click.Path(),
+              help='Directory to cache contact maps of find mode in')
+@click.option('--threads', default=1, type=int,
+              help='Number of worker processes in batch mode')
 @click.option('--verbose', '-v', is_flag=True, help='Verbose mode')
 @click.argument('confile', nargs=1, type=click.Path(exists=True))
 @click.argument('infile', nargs=1, type=click.Path(exists=True))
 @click.argument('outfile', nargs=1, default=None, type=click.Path(),
                 required=False)
 def _contacts(mode, confile, infile, outfile, aminoacid,
-              cutoff, minsep, topl, contype, verbose):
+              cutoff, minsep, topl, contype, chain, fmt, cache_dir, threads,
+              verbose):
 
     if contype == 'all':
         contacts_type = 'all'
     elif contype == 'sr':
         contacts_type = 'short-range (<= 23 residues)'
+    elif contype == 'mr':
+        contacts_type = 'medium-range (12-23 residues)'
     elif contype == 'lr':
         contacts_type = 'long-range (> 23 residues)'
 
@@ -275,7 +1171,8 @@ def _contacts(mode, confile, infile, outfile, aminoacid,
     else:
         out_cons_fh = None
 
-    coords = read_PDB_coordinates(open(infile, 'r'), aminoacid)
+    if mode in ('precision', 'metrics', 'table', 'batch'):
+        coords = read_PDB_arrays(infile, aminoacid, chain)
 
     if mode == 'precision':
         # read contacts
@@ -293,7 +1190,76 @@ def _contacts(mode, confile, infile, outfile, aminoacid,
               (pred_precision, infile.split('/')[-1],
                int(topl), contacts_type))
 
+    elif mode == 'metrics':
+        pred_contacts, _ = read_contact_predictions(
+            open(confile, 'r'), _topN_contacts(coords, topl), contype, minsep)
+        metrics = contact_metrics(coords, pred_contacts, cutoff, minsep,
+                                  contype)
+        for metric in ['precision', 'recall', 'f1', 'mcc',
+                       'fp_distance_error']:
+            print('%s: %.4f for %s top-L/%i %s contacts' %
+                  (metric, metrics[metric], infile.split('/')[-1],
+                   int(topl), contacts_type))
+
+    elif mode == 'table':
+        table = precision_table(coords, open(confile, 'r'),
+                                contypes=('all', 'sr', 'mr', 'lr'),
+                                con_coff=cutoff, minsep=minsep)
+        for row in table:
+            line = '%s L/%i Precision = %.4f  %i correct in top %i\n' % (
+                row[0], row[1], row[4], row[3], row[2])
+            if out_cons_fh:
+                out_cons_fh.write(line)
+            else:
+                print(line, end='')
+
+    elif mode == 'ensemble':
+        # the first chain, unless a chain is given
+        models = next(iter(read_PDB_models(infile, aminoacid,
+                                           chain).values()))
+        pred_contacts, _ = read_contact_predictions(
+            open(confile, 'r'), _topN_contacts(models, topl), contype, minsep)
+        precisions, consensus = ensemble_precision(models, pred_contacts,
+                                                   cutoff, minsep)
+        for model, pred_precision in enumerate(precisions, 1):
+            print('precision: %.4f for %s model %i top-L/%i %s contacts' %
+                  (pred_precision, infile.split('/')[-1], model,
+                   int(topl), contacts_type))
+        print('precision: %.4f for %s consensus top-L/%i %s contacts' %
+              (consensus, infile.split('/')[-1], int(topl), contacts_type))
+
+    elif mode == 'batch':
+        summary = batch_precision(coords, find_prediction_files(confile),
+                                  topl, contype, cutoff, minsep, aminoacid,
+                                  threads)
+        if out_cons_fh:
+            write_summary(summary, out_cons_fh)
+            out_cons_fh.close()
+        else:
+            for row in summary:
+                print('precision: %.4f for %s top-L/%i %s contacts' %
+                      (row[3], row[0].split('/')[-1], int(topl),
+                       contacts_type))
+
+    elif mode == 'find' and (fmt == 'npz' or cache_dir is not None):
+        resids, i, j, dist = contact_map(infile, aminoacid, cutoff, chain,
+                                         cache_dir)
+        i, j, dist = _contact_window(resids, i, j, dist,
+                                     *_contype(contype, minsep))
+        if out_cons_fh and fmt == 'npz':
+            out_cons_fh.close()
+            write_contact_map(outfile, resids, i, j, dist)
+        elif out_cons_fh:
+            out_cons_fh.write(''.join('%s\t%s\t%.4f\n' % _contact
+                                      for _contact in _contact_tuples(
+                                          resids, i, j, dist)))
+            out_cons_fh.close()
+        else:
+            for cons in _contact_tuples(resids, i, j, dist):
+                print('%s\t%s\t%.2f' % cons)
+
     elif mode == 'find':
+        coords = read_PDB_arrays(infile, aminoacid, chain)
         for cons in find_PDB_contacts(coords, out_cons_fh,
                                       cutoff, minsep, contype):
             print('%s\t%s\t%.2f' % (str(cons[0]), str(cons[1]),
@@ -0,0 +1,232 @@
+import os
+import re
+from glob import glob
+from multiprocessing import Pool
+
+import click
+import numpy as np
+
+from microprot.scripts.split_search import (iter_pdb_match, Hit,
+                                            _open_binary, _HIT_DTYPE)
+
+
+"""
+Export parsed HHsearch hits of many output files into one columnar table,
+such that hits can be queried by column scans instead of re-parsing text.
+"""
+
+
+# columns of the exported hit table and their types
+_COLUMNS = [('name', str),
+            ('query', str),
+            ('hit', str),
+            ('No', np.int32),
+            ('Probab', np.float64),
+            ('E_value', np.float64),
+            ('P_value', np.float64),
+            ('Score', np.float64),
+            ('Identities', np.float64),
+            ('Aligned_cols', np.int32),
+            ('Template_Neff', np.float64),
+            ('q_start', np.int32),
+            ('q_end', np.int32),
+            ('t_start', np.int32),
+            ('t_end', np.int32)]
+
+# HHsearch output files, plain or compressed
+_OUT_PATTERN = re.compile(r'\.out(\.gz|\.bz2|\.xz)?$')
+
+
+def find_out_files(path):
+    """ Collects HHsearch output files of a directory tree.
+
+    Parameters
+    ----------
+    path : str
+        Root directory, searched recursively for files with extension '.out',
+        optionally followed by '.gz', '.bz2' or '.xz'.
+
+    Returns
+    -------
+    [str] sorted filepaths of HHsearch output files.
+    """
+    return sorted(fp for fp in glob(os.path.join(path, '**', '*'),
+                                    recursive=True)
+                  if _OUT_PATTERN.search(fp) and os.path.isfile(fp))
+
+
+def read_query_name(filename):
+    """ Reads the query name from the header of an HHsearch output file.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the HHsearch output file, see split_search.parse_pdb_match.
+
+    Returns
+    -------
+    str : the query identifier, i.e. the first word after 'Query', or an
+    empty str if the header holds no query.
+    """
+    header = []
+    with _open_binary(filename) as fh:
+        for line in fh:
+            if line.startswith(b' No Hit'):
+                break
+            header.append(line.decode())
+    return _query_name(header)
+
+
+def _query_name(header):
+    """ The first word after 'Query' in header lines, or an empty str. """
+    for line in header:
+        if line.startswith('Query'):
+            fields = line.split()
+            return fields[1] if len(fields) > 1 else ''
+    return ''
+
+
+def hit_columns(filename):
+    """ Parses an HHsearch output file into the columns of the hit table.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the HHsearch output file, see split_search.parse_pdb_match.
+
+    Returns
+    -------
+    {str: numpy.ndarray} one array per column of _COLUMNS, one row per hit.
+    """
+    header = []
+    hits = list(iter_pdb_match(filename, header=header))
+    table = np.array([_hit_record(hit) for hit in hits], dtype=_HIT_DTYPE)
+    name = _OUT_PATTERN.sub('', os.path.basename(filename))
+
+    columns = {'name': np.array([name] * len(hits), dtype=str),
+               'query': np.array([_query_name(header)] * len(hits),
+                                 dtype=str),
+               'hit': np.array([hit['Hit'].split()[0] for hit in hits],
+                               dtype=str),
+               'Aligned_cols': np.array([hit['Aligned_cols'] for hit in hits],
+                                        dtype=np.int32),
+               'Template_Neff': np.array([hit['Template_Neff']
+                                          for hit in hits],
+                                         dtype=np.float64)}
+    for column in table.dtype.names:
+        columns[column] = table[column]
+    return columns
+
+
+def _hit_record(hit):
+    """ Numeric fields of a hit, see split_search.hit_table. """
+    hit = Hit.from_dict(hit)
+    return (hit.No, hit.Probab, hit.E_value, hit.P_value, hit.Score,
+            hit.Identities, hit.q_start, hit.q_end, hit.t_start, hit.t_end)
+
+
+def _concat_columns(chunks):
+    """ Concatenates the columns of several files into one table. """
+    columns = {}
+    for column, type_ in _COLUMNS:
+        arrays = [chunk[column] for chunk in chunks]
+        if len(arrays) == 0:
+            columns[column] = np.array([], dtype=type_)
+        else:
+            columns[column] = np.concatenate(arrays)
+    return columns
+
+
+def _write_npz(chunks, filenames, out_fp):
+    """ Writes all rows into one compressed npz file.
+
+    Besides the columns, the npz holds 'row_groups', i.e. for each input
+    file the index of its first row, followed by the total number of rows,
+    and 'sources', the input filepaths.
+    """
+    chunks = list(chunks)
+    columns = _concat_columns(chunks)
+    columns['row_groups'] = np.cumsum(
+        [0] + [len(chunk['No']) for chunk in chunks]).astype(np.int64)
+    columns['sources'] = np.array(filenames, dtype=str)
+    np.savez_compressed(out_fp, **columns)
+
+
+def _write_parquet(chunks, out_fp):
+    """ Writes the rows of each input file as one Parquet row group. """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError('Parquet export needs the optional dependency '
+                          '"pyarrow".')
+
+    schema = pa.schema([(column, pa.string() if type_ is str else
+                         pa.from_numpy_dtype(type_))
+                        for column, type_ in _COLUMNS])
+    with pq.ParquetWriter(out_fp, schema) as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(chunk[column]) for column, _ in _COLUMNS],
+                schema=schema))
+
+
+def export_hits(filenames, out_fp, fmt='npz', n_jobs=1):
+    """ Exports the hits of many HHsearch output files into a columnar table.
+
+    Parameters
+    ----------
+    filenames : [str]
+        HHsearch output files, e.g. as returned by find_out_files.
+    out_fp : str
+        Filepath of the resulting table.
+    fmt : str
+        Either 'npz' for a compressed NumPy archive, or 'parquet' for an
+        Apache Parquet file, which needs pyarrow. Rows of each input file make
+        up one row group. Default: 'npz'.
+    n_jobs : int
+        Number of worker processes parsing the files.
+        Default: 1, i.e. no worker processes.
+
+    Raises
+    ------
+    ValueError
+        If fmt is unknown.
+    ImportError
+        If fmt is 'parquet' and pyarrow is not installed.
+    IOError
+        If a file cannot be read or written.
+    """
+    if fmt not in ('npz', 'parquet'):
+        raise ValueError('Unknown export format "%s".' % fmt)
+
+    pool = Pool(n_jobs) if n_jobs > 1 else None
+    try:
+        # ordered, such that row groups follow the order of filenames
+        if pool is not None:
+            chunks = pool.imap(hit_columns, filenames)
+        else:
+            chunks = map(hit_columns, filenames)
+        if fmt == 'npz':
+            _write_npz(chunks, filenames, out_fp)
+        else:
+            _write_parquet(chunks, out_fp)
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+@click.command()
+@click.argument('inp_dir', type=click.Path(exists=True, file_okay=False))
+@click.argument('out_fp', type=click.Path())
+@click.option('--format', '-f', 'fmt', default='npz',
+              type=click.Choice(['npz', 'parquet']),
+              help='Format of the hit table')
+@click.option('--threads', '-t', default=1, type=int,
+              help='Number of worker processes')
+def _export_hits(inp_dir, out_fp, fmt, threads):
+    export_hits(find_out_files(inp_dir), out_fp, fmt=fmt, n_jobs=threads)
+
+
+if __name__ == "__main__":
+    _export_hits()
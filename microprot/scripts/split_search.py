@@ -1,7 +1,22 @@
+import io
+import os
 import sys
 import re
+import mmap
+import gzip
+import bz2
+import lzma
+import tarfile
+import pickle
+import hashlib
+from glob import glob
+from multiprocessing import Pool
+from bisect import bisect_right
+from collections import OrderedDict
+from contextlib import contextmanager
 
 import click
+import numpy as np
 from skbio import Protein
 
 _HEADER = ['No',
@@ -16,6 +31,54 @@ _HEADER = ['No',
            'Template HMM',
            '#match states']
 
+# The hit summary table rounds Prob to one decimal and E-values to two
+# significant digits. Tolerances used when pre-filtering on those values.
+_PROB_TOLERANCE = 0.1
+_EVALUE_TOLERANCE = 1.1
+
+# Fast paths for hit summary lines and alignment block stats lines. Lines not
+# following this layout are parsed by more tolerant, but slower code.
+# Width of the hit description column in hit summary lines.
+_SUMMARY_DESC_WIDTH = 30
+_STATS_LINE = re.compile(
+    r'Probab=(\S+)\s+E-value=(\S+)\s+Score=(\S+)\s+Aligned_cols=(\d+)\s+'
+    r'Identities=(\S+)%\s+Similarity=(\S+)\s+Sum_probs=(\S+)\s+'
+    r'Template_Neff=(\S+)\s*$')
+
+# version of the parsed hits format, part of the key of cached hits
+_CACHE_VERSION = 2
+# default upper bound for the size of a hits cache directory: 1 GB
+_CACHE_MAX_BYTES = 2**30
+# estimated size of the entries of each hits cache directory, by absolute
+# path. Only this process' stores are added, each eviction scan resets it.
+_CACHE_SIZES = {}
+
+# openers of compressed files, by file name extension
+_DECOMPRESSORS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+# file name extensions of tar archives, e.g. packaged per-sequence outputs
+_TAR_EXTENSIONS = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+# numeric columns of a hit, see Hit and hit_table
+_HIT_DTYPE = np.dtype([('No', np.int32),
+                       ('Probab', np.float64),
+                       ('E_value', np.float64),
+                       ('P_value', np.float64),
+                       ('Score', np.float64),
+                       ('Identities', np.float64),
+                       ('q_start', np.int32),
+                       ('q_end', np.int32),
+                       ('t_start', np.int32),
+                       ('t_end', np.int32)])
+
+# keys of parsed hit dicts and the according Hit attributes
+_HIT_KEYS = {'No': 'No',
+             'Hit': 'description',
+             'Probab': 'Probab',
+             'E-value': 'E_value',
+             'P-value': 'P_value',
+             'Score': 'Score',
+             'Identities': 'Identities'}
+
 
 def is_overlapping(intA, intB):
     ''' Test if two intervals overlap.
@@ -46,13 +109,68 @@ def is_overlapping(intA, intB):
                 ((intA[1] < intB[0]) & (intA[1] < intB[1])))
 
 
+class _IntervalIndex(object):
+    """ Sorted index of closed, non-overlapping intervals.
+
+    Since intervals in the index do not overlap, their start and end
+    positions are sorted alike. Thus, whether an interval overlaps with any
+    interval of the index can be answered by a binary search for the
+    right-most indexed interval that starts not after the queried end.
+    If intervals are only added after testing them with a tolerance, they
+    may overlap by up to that many positions. Such tests scan backwards from
+    the binary search position, bounded by the longest indexed interval.
+
+    Parameters
+    ----------
+    intervals : iterable of (int, int)
+        Initial intervals, e.g. [(20, 100), (150, 200)]. Left component must
+        be <= right.
+    """
+    def __init__(self, intervals=()):
+        self._starts = []
+        self._ends = []
+        self._max_len = 0
+        for start, end in intervals:
+            self.add(start, end)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __iter__(self):
+        """ Iterates (start, end) pairs, sorted by start position. """
+        return zip(self._starts, self._ends)
+
+    def overlaps(self, start, end, tolerance=0):
+        """ Test if interval (start, end) overlaps any indexed interval by
+            more than tolerance positions. """
+        idx = bisect_right(self._starts, end)
+        if tolerance <= 0:
+            return (idx > 0) and (self._ends[idx-1] >= start)
+        for i in range(idx-1, -1, -1):
+            if self._starts[i] + self._max_len <= start:
+                break
+            if min(self._ends[i], end) - max(self._starts[i], start) \
+               >= tolerance:
+                return True
+        return False
+
+    def add(self, start, end):
+        """ Insert interval (start, end), keeping the index sorted. """
+        idx = bisect_right(self._starts, start)
+        self._starts.insert(idx, start)
+        self._ends.insert(idx, end)
+        self._max_len = max(self._max_len, end - start + 1)
+
+
 def _parse_hit_summary_line(line):
     """ Parses a single hit summary line of HHsearch.
 
     Fields are described in [1]. Unfortunately, there is no single dedicated
-    separator char plus the second field might contain whitespaces. Thus, I
-    split the line on \s and consume the first element for the 'hit index'. The
-    'description' are all elements that are not consumed by the last 9 fields.
+    separator char plus the second field might contain whitespaces. Lines
+    following the usual layout, i.e. the hit index, a description column of
+    _SUMMARY_DESC_WIDTH characters and exactly 9 whitespace separated fields,
+    are sliced by these columns. All other lines, e.g. with fused Template
+    HMM columns, are parsed by _parse_hit_summary_fields.
 
     Parameters
     ----------
@@ -73,7 +191,40 @@ def _parse_hit_summary_line(line):
         ftp://ftp.tuebingen.mpg.de/pub/protevo/HHsearch/HHsearch1.5.01/HHsearc
         h-guide.pdf
     """
+    # fast path: fixed width description column, followed by 9 fields
+    stripped = line.lstrip()
+    pos = stripped.find(' ') + 1
+    fields = stripped[pos+_SUMMARY_DESC_WIDTH:].split()
+    if (pos == 0) or (len(fields) != 9) or (not fields[8].startswith('(')):
+        return _parse_hit_summary_fields(line)
+
+    desc = stripped[pos:pos+_SUMMARY_DESC_WIDTH].rstrip()
+    if '  ' in desc:
+        desc = " ".join(desc.split())
+    try:
+        return {_HEADER[0]: int(stripped[:pos]),
+                _HEADER[1]: desc,
+                _HEADER[2]: float(fields[0]),
+                _HEADER[3]: float(fields[1]),
+                _HEADER[4]: float(fields[2]),
+                _HEADER[5]: float(fields[3]),
+                _HEADER[6]: float(fields[4]),
+                _HEADER[7]: int(fields[5]),
+                _HEADER[8]: fields[6],
+                _HEADER[9]: fields[7],
+                _HEADER[10]: int(fields[8][1:-1])}
+    except ValueError:
+        return _parse_hit_summary_fields(line)
+
+
+def _parse_hit_summary_fields(line):
+    """ Tolerant, field based parsing of a hit summary line.
 
+    The line is split on whitespace; the first element is the 'hit index'
+    and the 'description' are all elements that are not consumed by the last
+    9 fields. Used for lines that do not follow the fixed column layout, see
+    _parse_hit_summary_line for parameters and return value.
+    """
     fields = line.rstrip().split()
 
     # In some cases the field for Template HMM start-end positions is too long,
@@ -149,7 +300,30 @@ def _parse_hit_summary_line(line):
                          " summary line.")
 
 
-def _parse_hit_block(block):
+def _parse_stats_fields(stats):
+    """ Tolerant, field based parsing of the stats line of an alignment block.
+
+    Used for lines that do not match the _STATS_LINE pattern.
+
+    Parameters
+    ----------
+    stats : str
+        The stats line, e.g. 'Probab=99.96  E-value=1.3e-34  Score=...'.
+
+    Returns
+    -------
+    A dict of the raw str values by field name. The '%' sign of
+    'Identities' is removed.
+    """
+    fields = {}
+    for field in stats.rstrip().split('  '):
+        key, value = field.split('=')
+        fields[key] = value
+    fields['Identities'] = fields['Identities'][:-1]
+    return fields
+
+
+def _parse_hit_block(block, names=None):
     """ Parse one alignment block of HHsearch output.
 
     Unfortunately, there is no strict format description. It is unclear which
@@ -160,34 +334,49 @@ def _parse_hit_block(block):
     Due to all those uncertainties the code might look confusing at first
     sight.
 
+    The block is processed as bytes. Segments of wrapped alignment lines are
+    collected and joined once per line name, and only decoded if the line
+    name is requested.
+
     Parameters
     ----------
-    block : str
+    block : str or bytes
         The lines of the HHsearch output regarding to one alignment of query
         sequence and target HMM. It might be wrapped into several parts.
+    names : tuple of str
+        Prefixes of the alignment line names to be included, e.g. ('Q ', ) for
+        only the query lines 'Q Consensus' and 'Q xxx'.
+        Default: None, i.e. all alignment lines are included.
 
     Returns
     -------
     A dict holding all information about the aligment.
     """
 
+    if isinstance(block, str):
+        block = block.encode()
     hit = {}
-    lines = block.split('\n')
+    lines = block.split(b'\n')
 
     # Index of hit
     hit['No'] = int(lines[0].split()[1])
 
     # description of domain
-    hit['Hit'] = lines[1][1:]
+    hit['Hit'] = lines[1][1:].decode()
 
     # line with stats
-    for field in lines[2].rstrip().split('  '):
-        key, value = field.split('=')
-        hit[key] = value
+    stats = lines[2].decode()
+    match = _STATS_LINE.match(stats)
+    if match is not None:
+        (hit['Probab'], hit['E-value'], hit['Score'], hit['Aligned_cols'],
+         hit['Identities'], hit['Similarity'], hit['Sum_probs'],
+         hit['Template_Neff']) = match.groups()
+    else:
+        hit.update(_parse_stats_fields(stats))
     hit['Similarity'] = float(hit['Similarity'])
     hit['Score'] = float(hit['Score'])
     hit['Probab'] = float(hit['Probab'])
-    hit['Identities'] = float(hit['Identities'][:-1])/100
+    hit['Identities'] = float(hit['Identities'])/100
     hit['Aligned_cols'] = int(hit['Aligned_cols'])
     hit['E-value'] = float(hit['E-value'])
     hit['Sum_probs'] = float(hit['Sum_probs'])
@@ -195,106 +384,1012 @@ def _parse_hit_block(block):
 
     idx = 4
     block = {}
+    segments = {}
     while(idx+1 < len(lines)):
         # determin start and end column of alignment content
         [coord, content] = lines[idx+1].split()[2:4]
         coord_pos = lines[idx+1].find(coord)
         startCol = lines[idx+1].find(content, coord_pos)
         endCol = startCol + len(content)
-        while((idx+1 < len(lines)) & (lines[idx] != '')):
+        while((idx+1 < len(lines)) & (lines[idx] != b'')):
+            line = lines[idx]
+            idx += 1
             start = None
-            if lines[idx].startswith(' '):
+            if line.startswith(b' '):
                 name = 'column score'
             else:
-                parts = lines[idx][:startCol].split()
+                parts = line[:startCol].split()
                 try:
                     start = int(parts[-1])  # check if last part is a number
-                    name = lines[idx][:lines[idx][:startCol].rfind(parts[-1])]
+                    name = line[:line[:startCol].rfind(parts[-1])]
                 except ValueError:
-                    name = lines[idx][:startCol]
-                name = name.rstrip()
+                    name = line[:startCol]
+                name = name.rstrip().decode()
+            if (names is not None) and (not name.startswith(names)):
+                continue
             if name not in block:
-                block[name] = {'sequence': lines[idx][startCol:endCol]}
+                block[name] = {}
+                segments[name] = []
                 if start is not None:
                     block[name]['start'] = start
-            else:
-                block[name]['sequence'] += lines[idx][startCol:endCol]
-            if lines[idx][endCol:] != '':
-                fields = lines[idx][endCol:].split()
+            segments[name].append(line[startCol:endCol])
+            if line[endCol:] != b'':
+                fields = line[endCol:].split()
                 block[name]['end'] = int(fields[0])
                 block[name]['totallen'] = int(fields[1][1:-1])
-            idx += 1
         idx += 2
 
+    for name in block:
+        block[name]['sequence'] = b''.join(segments[name]).decode()
     hit['alignment'] = block
 
     return hit
 
 
-def parse_pdb_match(filename):
+class Hit(object):
+    """ Compact representation of one parsed HHsearch hit.
+
+    Holds the numeric fields of a hit as typed attributes plus the gapped
+    query row of the alignment. In contrast to the nested dicts returned by
+    parse_pdb_match, query positions are directly accessible without
+    searching for the query key, see get_q_id. For compatibility with
+    functions like select_hits, the fields are also accessible via the keys
+    of the parsed hit dicts, e.g. hit['E-value'].
+
+    Parameters
+    ----------
+    No : int
+        Index of the hit.
+    description : str
+        Description of the hit, starting with its identifier.
+    Probab : float
+        Probability of the hit to be a true positive, range 0.0 to 100.0
+    E_value : float
+        Expect-value of the hit.
+    P_value : float
+        P-value of the hit.
+    Score : float
+        Raw score of the hit.
+    Identities : float
+        Pair-wise sequence identity, range 0.0 to 1.0
+    q_start, q_end : int
+        Aligned range of the query, first position is 1.
+    t_start, t_end : int
+        Aligned range of the template, first position is 1.
+    q_sequence : str
+        The aligned, gapped query sub-sequence. Default: None
+    """
+    __slots__ = ('No', 'description', 'Probab', 'E_value', 'P_value',
+                 'Score', 'Identities', 'q_start', 'q_end', 't_start',
+                 't_end', 'q_sequence')
+
+    def __init__(self, No, description, Probab, E_value, P_value, Score,
+                 Identities, q_start, q_end, t_start=0, t_end=0,
+                 q_sequence=None):
+        self.No = int(No)
+        self.description = description
+        self.Probab = float(Probab)
+        self.E_value = float(E_value)
+        self.P_value = float(P_value)
+        self.Score = float(Score)
+        self.Identities = float(Identities)
+        self.q_start = int(q_start)
+        self.q_end = int(q_end)
+        self.t_start = int(t_start)
+        self.t_end = int(t_end)
+        self.q_sequence = q_sequence
+
+    @classmethod
+    def from_dict(cls, hit):
+        """ Creates a Hit from a hit dict, as returned by parse_pdb_match.
+
+        Parameters
+        ----------
+        hit : dict
+            A parsed HHsearch hit.
+
+        Returns
+        -------
+        Hit
+
+        Notes
+        -----
+        Positions of hits without a query alignment line are taken from the
+        summary table and q_sequence is None, see _merge_hit.
+        """
+        q_start, q_end = _q_range(hit)
+        t_keys = [key for key in hit['alignment']
+                  if key.startswith('T ') and
+                  key not in ('T Consensus', 'T ss_dssp', 'T ss_pred')]
+        if t_keys:
+            t = hit['alignment'][t_keys[0]]
+            t_start, t_end = t['start'], t['end']
+        elif _HEADER[9] in hit:
+            t_start, t_end = _summary_range(hit[_HEADER[9]])
+        else:
+            t_start, t_end = 0, 0
+        return cls(hit['No'], hit['Hit'], hit['Probab'], hit['E-value'],
+                   hit.get('P-value', np.nan), hit['Score'],
+                   hit['Identities'], q_start, q_end, t_start, t_end,
+                   _q_sequence(hit))
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, _HIT_KEYS[key])
+        except KeyError:
+            raise KeyError(key)
+
+    def __eq__(self, other):
+        return isinstance(other, Hit) and \
+            all(getattr(self, name) == getattr(other, name)
+                for name in self.__slots__)
+
+    def __repr__(self):
+        return '<Hit No=%i %s %i-%i>' % (self.No, self.description.split()[0],
+                                         self.q_start, self.q_end)
+
+    @property
+    def frag_size(self):
+        """ Length of the query sub-sequence covered by this hit. """
+        return self.q_end - self.q_start + 1
+
+
+def hit_table(hits):
+    """ Collects the numeric fields of hits into a structured array.
+
+    Parameters
+    ----------
+    hits : [Hit] or [dict]
+        HHsearch hits, either as Hit objects or as dicts as returned by
+        parse_pdb_match.
+
+    Returns
+    -------
+    numpy.ndarray with dtype _HIT_DTYPE, one row per hit.
+    """
+    hits = [hit if isinstance(hit, Hit) else Hit.from_dict(hit)
+            for hit in hits]
+    return np.array([(hit.No, hit.Probab, hit.E_value, hit.P_value, hit.Score,
+                      hit.Identities, hit.q_start, hit.q_end, hit.t_start,
+                      hit.t_end) for hit in hits], dtype=_HIT_DTYPE)
+
+
+def _summary_table(summaries):
+    """ Collects numeric fields of hit summary lines into a structured array.
+
+    Identities are not part of the summary table and thus set to NaN.
+    """
+    rows = []
+    for hit in summaries:
+        rows.append((hit[_HEADER[0]], hit[_HEADER[2]], hit[_HEADER[3]],
+                     hit[_HEADER[4]], hit[_HEADER[5]], np.nan) +
+                    _summary_range(hit[_HEADER[8]]) +
+                    _summary_range(hit[_HEADER[9]]))
+    return np.array(rows, dtype=_HIT_DTYPE)
+
+
+def _summary_range(field):
+    """ Start and end position of a range of the summary table, e.g. '3-42'.
+    """
+    start, end = field.split('-')
+    return int(start), int(end)
+
+
+def filter_hits(hits, min_prob=None, max_pvalue=None, max_evalue=None,
+                min_fragment_length=None, min_identity=None):
+    """ Vectorized filtering of hits.
+
+    Parameters
+    ----------
+    hits : [Hit]
+        HHsearch hits.
+    min_prob: float
+        Minimal probability of a hit to be included in the resulting list.
+        Default: None, i.e. no filtering on probability.
+    max_pvalue: float
+        Maximal P-value of a hit to be included in the resulting list.
+        Default: None, i.e. no filtering on P-value.
+    max_evalue: float
+        Maximal E-value of a hit to be included in the resulting list.
+        Default: None, i.e. no filtering on E-value.
+    min_fragment_length: int
+        Minimal fragment length of a hit to be included in the resulting list.
+        Default: None, i.e. no filtering on fragment length.
+    min_identity: float
+        Minimum pair-wise sequence identity of a hit to be included in the
+        resulting list.
+        Default: None, i.e. no filtering on sequence identity.
+
+    Returns
+    -------
+    [Hit] the hits satisfying ALL filters, in their original order.
+    """
+    if len(hits) == 0:
+        return []
+    mask = _filter_mask(hit_table(hits), min_prob=min_prob,
+                        max_pvalue=max_pvalue, max_evalue=max_evalue,
+                        min_fragment_length=min_fragment_length,
+                        min_identity=min_identity)
+    return [hits[idx] for idx in np.flatnonzero(mask)]
+
+
+def _filter_mask(table, min_prob=None, max_pvalue=None, max_evalue=None,
+                 min_fragment_length=None, min_identity=None,
+                 prob_tolerance=0.0, evalue_tolerance=1.0):
+    """ Vectorized test which hits of a table satisfy the given thresholds.
+
+    Parameters
+    ----------
+    table : numpy.ndarray
+        Structured array of hits with dtype _HIT_DTYPE, see hit_table.
+    min_prob : float
+        Minimal probability. Default: None, i.e. no filtering.
+    max_pvalue : float
+        Maximal P-value. Default: None, i.e. no filtering.
+    max_evalue : float
+        Maximal E-value. Default: None, i.e. no filtering.
+    min_fragment_length : int
+        Minimal fragment length. Default: None, i.e. no filtering.
+    min_identity : float
+        Minimal sequence identity. Default: None, i.e. no filtering.
+    prob_tolerance : float
+        Absolute tolerance added to probabilities. Default: 0.0
+    evalue_tolerance : float
+        Relative tolerance multiplied to max_evalue. Default: 1.0
+
+    Returns
+    -------
+    numpy.ndarray of bool, True for hits that satisfy ALL thresholds.
+
+    Notes
+    -----
+    The summary table of HHsearch rounds Prob to one decimal and E-values to
+    two significant digits, while the alignment block of the same hit holds
+    more precise values. Tolerances allow to pre-filter on the rounded
+    values without discarding hits that would pass on the precise values.
+    """
+    mask = np.ones(table.shape[0], dtype=bool)
+    if min_prob is not None:
+        mask &= table['Probab'] + prob_tolerance >= min_prob
+    if max_pvalue is not None:
+        mask &= table['P_value'] <= max_pvalue
+    if max_evalue is not None:
+        mask &= table['E_value'] <= max_evalue * evalue_tolerance
+    if min_fragment_length is not None:
+        mask &= table['q_end'] - table['q_start'] + 1 >= min_fragment_length
+    if min_identity is not None:
+        mask &= table['Identities'] >= min_identity
+    return mask
+
+
+def _hit_passes(hit, min_prob=None, max_pvalue=None, max_evalue=None):
+    """ Tests if a fully parsed hit satisfies the given thresholds. """
+    if (min_prob is not None) and (hit['Probab'] < min_prob):
+        return False
+    if (max_pvalue is not None) and (hit['P-value'] > max_pvalue):
+        return False
+    if (max_evalue is not None) and (hit['E-value'] > max_evalue):
+        return False
+    return True
+
+
+def _merge_hit(summary, alignment):
+    """ Merges hit summary and according alignment into one dict. """
+    for key in alignment:
+        summary[key] = alignment[key]
+    # duplicate information, but more precicse on other place
+    del summary[_HEADER[2]]  # Prob
+    del summary[_HEADER[10]]  # match states
+    # positions of alignment blocks without a query line, e.g. of hits with a
+    # single aligned column, are only found in the summary table
+    if any(_is_q_id(key) for key in summary.get('alignment', {})):
+        del summary[_HEADER[8]]  # Query HMM
+        del summary[_HEADER[9]]  # Template HMM
+    return summary
+
+
+def _readline(fh):
+    """ Reads one line from a text or binary file handle as str. """
+    line = fh.readline()
+    if isinstance(line, bytes):
+        line = line.decode()
+    return line
+
+
+def _read_hit_summaries(fh, header=None):
+    """ Reads the summary table of an HHsearch output file.
+
+    Parameters
+    ----------
+    fh : file handle
+        HHsearch output file, opened in text or binary mode. Will be consumed
+        up to the empty line that terminates the summary table.
+    header : list
+        If given, the lines before the summary table, e.g. 'Query' and
+        'Match_columns', are appended to it. Default: None
+
+    Returns
+    -------
+    A list of hit summaries, as returned by _parse_hit_summary_line.
+
+    Raises
+    ------
+    ValueError
+        If no summary table header can be found.
+    """
+    summaries = []
+    line = _readline(fh)
+    # read until header of summary table is found
+    while(len(set(line.rstrip().split()) & set(_HEADER)) < 8):
+        if line == '':
+            raise ValueError("No HHsearch hit summary table found.")
+        if header is not None:
+            header.append(line)
+        line = _readline(fh)
+    line = _readline(fh)  # first summary line
+    # read all summary lines
+    while(line.strip() != ''):
+        summaries.append(_parse_hit_summary_line(line))
+        line = _readline(fh)
+    return summaries
+
+
+def _split_tar_path(filename):
+    """ Splits a path into a tar archive and the path of a member within.
+
+    Parameters
+    ----------
+    filename : str
+        Path of a file, or path of a tar archive followed by the path of a
+        member within the archive, e.g. 'pkg/seq.tar.gz/01-PDB/seq.out'.
+
+    Returns
+    -------
+    (str, str) the path of the archive and the member, or (filename, None) if
+    filename does not point into a tar archive.
+    """
+    if os.path.exists(filename):
+        return filename, None
+    parts = filename.split('/')
+    for i in range(1, len(parts)):
+        archive = '/'.join(parts[:i])
+        if archive.endswith(_TAR_EXTENSIONS) and os.path.isfile(archive):
+            return archive, '/'.join(parts[i:])
+    return filename, None
+
+
+def _is_plain_file(filename):
+    """ True if filename is neither compressed nor points into a tarball. """
+    archive, member = _split_tar_path(filename)
+    return (member is None) and \
+        (os.path.splitext(filename)[1] not in _DECOMPRESSORS)
+
+
+@contextmanager
+def _open_binary(filename):
+    """ Opens a file for streamed, binary reading.
+
+    Compressed files (.gz, .bz2, .xz) are decompressed on the fly. Members of
+    tar archives, addressed as path of the archive followed by the path of the
+    member, are streamed without extraction to disk.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the file.
+
+    Yields
+    ------
+    A binary file object with the (decompressed) content of the file.
+
+    Raises
+    ------
+    IOError
+        If the file, or the member of the archive, cannot be read.
+    """
+    archive, member = _split_tar_path(filename)
+    if member is None:
+        opener = _DECOMPRESSORS.get(os.path.splitext(filename)[1], open)
+        try:
+            fh = opener(filename, 'rb')
+        except (IOError, OSError):
+            raise IOError('Cannot read file "%s"' % filename)
+        with fh:
+            yield fh
+        return
+
+    # stream through the archive until the member is found
+    try:
+        tar = tarfile.open(archive, 'r|*')
+    except (IOError, OSError, tarfile.TarError):
+        raise IOError('Cannot read file "%s"' % filename)
+    with tar:
+        for info in tar:
+            if os.path.normpath(info.name) == os.path.normpath(member):
+                with tar.extractfile(info) as fh:
+                    yield fh
+                return
+    raise IOError('Cannot read file "%s"' % filename)
+
+
+@contextmanager
+def _read_buffer(filename):
+    """ Provides the whole content of a file as one buffer.
+
+    Plain files are memory mapped, compressed files and members of tar
+    archives are decompressed into memory.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the file, see _open_binary.
+
+    Yields
+    ------
+    mmap.mmap or bytes with the (decompressed) content of the file.
+
+    Raises
+    ------
+    IOError
+        If the file cannot be read.
+    """
+    if _is_plain_file(filename):
+        buf = _mmap_file(filename)
+        try:
+            yield buf
+        finally:
+            buf.close()
+    else:
+        with _open_binary(filename) as fh:
+            buf = fh.read()
+        yield buf
+
+
+def iter_pdb_match(filename, min_prob=None, max_pvalue=None,
+                   max_evalue=None, as_hits=False, header=None):
+    """ Lazily parse an HHsearch output file, hit by hit.
+
+    The summary table is read first. Alignment blocks are only parsed for
+    hits whose summary can satisfy the thresholds and reading stops after the
+    block of the last such hit. Since HHsearch sorts hits by probability,
+    this is usually close to the top of the alignment section.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the HHsearch output file that should be parsed. The file may
+        be compressed (.gz, .bz2, .xz) or be a member of a tar archive, given
+        as path of the archive followed by the path of the member, e.g.
+        'pkg/seq.tar.gz/01-PDB/seq.out'.
+    min_prob : float
+        Minimal probability of a hit to be yielded.
+        Default: None, i.e. no filtering on probability.
+    max_pvalue : float
+        Maximal P-value of a hit to be yielded.
+        Default: None, i.e. no filtering on P-value.
+    max_evalue : float
+        Maximal E-value of a hit to be yielded.
+        Default: None, i.e. no filtering on E-value.
+    as_hits : bool
+        Yield compact Hit objects instead of dicts. Only the query and
+        template rows of alignments are parsed and each hit's dict is
+        discarded right away. Default: False.
+    header : list
+        If given, the lines of the file before the summary table are appended
+        to it, once the first hit is requested. Default: None
+
+    Yields
+    ------
+    dict or Hit
+        One HHsearch hit at a time, holding all its information, in the order
+        of the HHsearch output.
+
+    Raises
+    ------
+    IOError
+        If the file cannot be read.
+    """
+    with _open_binary(filename) as fh:
+        summaries = _read_hit_summaries(fh, header)
+        mask = _filter_mask(_summary_table(summaries), min_prob=min_prob,
+                            max_pvalue=max_pvalue, max_evalue=max_evalue,
+                            prob_tolerance=_PROB_TOLERANCE,
+                            evalue_tolerance=_EVALUE_TOLERANCE)
+        candidates = {summaries[idx][_HEADER[0]]: summaries[idx]
+                      for idx in np.flatnonzero(mask)}
+        if len(candidates) == 0:
+            return
+        last = max(candidates)
+
+        # read the alignments of candidate hits only
+        names = ('Q ', 'T ') if as_hits else None
+        block = None
+        for line in fh:
+            if line.startswith(b'No ') & (len(line.split()) == 2):
+                if block is not None:
+                    hit = _parse_hit_block(b''.join(block), names)
+                    hit = _merge_hit(candidates[hit['No']], hit)
+                    if _hit_passes(hit, min_prob, max_pvalue, max_evalue):
+                        yield Hit.from_dict(hit) if as_hits else hit
+                    block = None
+                number = int(line.split()[1])
+                if number > last:
+                    return
+                if number in candidates:
+                    block = [line]
+            elif block is not None:
+                block.append(line)
+        if block is not None:
+            hit = _parse_hit_block(b''.join(block), names)
+            hit = _merge_hit(candidates[hit['No']], hit)
+            if _hit_passes(hit, min_prob, max_pvalue, max_evalue):
+                yield Hit.from_dict(hit) if as_hits else hit
+
+
+def parse_pdb_match(filename, cache_dir=None, cache_max_bytes=None,
+                    hash_content=False, as_hits=False):
     """ Parse an HHsearch output file.
 
     Parameters
     ----------
     filename : str
-        Path to the HHsearch output file that should be parsed.
+        Path to the HHsearch output file that should be parsed. The file may
+        be compressed (.gz, .bz2, .xz) or be a member of a tar archive, given
+        as path of the archive followed by the path of the member, e.g.
+        'pkg/seq.tar.gz/01-PDB/seq.out'.
+    cache_dir : str
+        Directory of a cache for parsed hits. If given, hits are loaded from
+        the cache if present, otherwise parsed and stored in the cache.
+        Default: None, i.e. no caching.
+    cache_max_bytes : int
+        Upper bound for the size of cache_dir. Least recently used entries
+        are evicted when exceeded. Default: None, i.e. 1 GB.
+    hash_content : bool
+        Key cache entries by a hash of the file content instead of its path,
+        size and modification time. Survives moving or touching files, but
+        needs to read the file. Default: False.
+    as_hits : bool
+        Return compact Hit objects instead of dicts, see iter_pdb_match.
+        Cached entries hold the complete hit dicts. Default: False.
 
     Returns
     -------
-    A list of HHsearch hits. Each hit is a dict, holding all its information.
+    A list of HHsearch hits. Each hit is a dict, holding all its information,
+    or a Hit.
 
     Raises
     ------
     IOError
         If the file cannot be read.
     """
+    if cache_dir is None:
+        return list(iter_pdb_match(filename, as_hits=as_hits))
+
+    key = _cache_key(filename, hash_content)
+    hits = _load_cached_hits(cache_dir, key)
+    if hits is None:
+        hits = list(iter_pdb_match(filename))
+        _store_cached_hits(cache_dir, key, hits, cache_max_bytes)
+    if as_hits:
+        return [Hit.from_dict(hit) for hit in hits]
+    return hits
+
+
+def parse_blasttab(filename, percent_identity=False):
+    """ Parse tabular HH-suite output, as written with option '-blasttab'.
+
+    Each line holds query, target, identity, alignment length, number of
+    mismatches, number of gap openings, query start and end, template start
+    and end, E-value and bit score, tab separated, as in BLAST's m8 format.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the tabular file, holding the results of one query. May be
+        compressed or a member of a tar archive, see parse_pdb_match.
+    percent_identity : bool
+        If True, identities are given as percentages, as written by BLAST,
+        and are converted to fractions.
+        Default: False, i.e. identities are fractions, as written by HH-suite.
+
+    Returns
+    -------
+    A list of hits, in the order of the file. Each hit is a dict with the
+    same keys as those returned by parse_pdb_match, limited to what the
+    table holds. 'Probab' and 'P-value' are NaN, alignment lines only hold
+    'start' and 'end' positions.
+
+    Raises
+    ------
+    IOError
+        If the file cannot be read.
+    ValueError
+        If a line holds less than 12 fields.
+    """
+    rows = []
+    with _open_binary(filename) as fh:
+        for line in fh:
+            if (line.strip() == b'') or line.startswith(b'#'):
+                continue
+            fields = line.decode().rstrip('\n').split('\t')
+            if len(fields) < 12:
+                raise ValueError('Tabular line "%s" must hold at least 12 '
+                                 'fields.' % line.decode().rstrip())
+            rows.append(fields)
+
+    identities = np.array([float(fields[2]) for fields in rows])
+    if percent_identity:
+        identities /= 100
+
     hits = []
+    for no, (fields, identity) in enumerate(zip(rows, identities), 1):
+        hits.append({'No': no,
+                     'Hit': fields[1],
+                     'Probab': np.nan,
+                     'E-value': float(fields[10]),
+                     'P-value': np.nan,
+                     'Score': float(fields[11]),
+                     'Aligned_cols': int(fields[3]),
+                     'Identities': float(identity),
+                     'alignment': {
+                        'Q %s' % fields[0]: {'start': int(fields[6]),
+                                             'end': int(fields[7])},
+                        'T %s' % fields[1]: {'start': int(fields[8]),
+                                             'end': int(fields[9])}}})
+    return hits
+
+
+def _cache_key(filename, hash_content=False):
+    """ Computes the key of the cache entry for an HHsearch output file.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the HHsearch output file.
+    hash_content : bool
+        If True, hash the (decompressed) file content. Otherwise hash the
+        absolute path, size and modification time of the file, or of the
+        archive holding it. Default: False.
+
+    Returns
+    -------
+    str : hex digest identifying the parsed hits of the file.
+
+    Raises
+    ------
+    IOError
+        If the file cannot be read.
+    """
+    digest = hashlib.sha1(('%i\t' % _CACHE_VERSION).encode())
     try:
-        fh = open(filename, 'r')
-        line = ""
-
-        # read until header of summary table is found
-        while(len(set(line.rstrip().split()) & set(_HEADER)) < 8):
-            line = fh.readline()
-        line = fh.readline()  # summary table header line
-        # read all summary lines
-        while(line != '\n'):
-            hits.append(_parse_hit_summary_line(line))
-            line = fh.readline()
-
-        # read the alignments
-        reachedEOF = False
-        alignments = []
-        block = ''
-        while(not reachedEOF):
-            line = fh.readline()
-            reachedEOF = line == ''
-            if line.startswith('No ') & (len(line.split()) == 2):
-                if block != '':
-                    alignments.append(_parse_hit_block(block))
-                block = line
-            else:
-                block += line
-        if block != '':
-            alignments.append(_parse_hit_block(block))
-
-        # merge hit summary and according alignment
-        for idx in range(len(hits)):
-            for key in alignments[idx]:
-                hits[idx][key] = alignments[idx][key]
-            # duplicate information, but more precicse on other place
-            del hits[idx][_HEADER[2]]  # Prob
-            del hits[idx][_HEADER[8]]  # Query HMM
-            del hits[idx][_HEADER[9]]  # Template HMM
-            del hits[idx][_HEADER[10]]  # match states
-
-        fh.close()
-        return hits
+        if hash_content:
+            with _open_binary(filename) as f:
+                for chunk in iter(lambda: f.read(2**20), b''):
+                    digest.update(chunk)
+        else:
+            stat = os.stat(_split_tar_path(filename)[0])
+            digest.update(('%s\t%i\t%i' % (os.path.abspath(filename),
+                                           stat.st_size,
+                                           stat.st_mtime_ns)).encode())
+    except (IOError, OSError):
+        raise IOError('Cannot read file "%s"' % filename)
+    return digest.hexdigest()
+
+
+def _load_cached_hits(cache_dir, key):
+    """ Loads parsed hits from the cache, None if there is no such entry. """
+    fp = os.path.join(cache_dir, '%s.pkl' % key)
+    try:
+        with open(fp, 'rb') as f:
+            hits = pickle.load(f)
+    except (IOError, OSError, EOFError, pickle.UnpicklingError):
+        return None
+    # mark entry as recently used, for eviction
+    try:
+        os.utime(fp)
+    except OSError:
+        pass
+    return hits
+
+
+def _store_cached_hits(cache_dir, key, hits, max_bytes=None):
+    """ Stores parsed hits in the cache and evicts entries if necessary.
+
+    The entry is written to a temporary file first and then renamed, such
+    that concurrent processes never read partially written entries.
+    The size of the cache directory is scanned once and then estimated by
+    adding the sizes of stored entries. Entries are only evicted, with a
+    new scan, once the estimate exceeds max_bytes, such that storing N
+    entries does not stat the directory N times.
+    """
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+    fp = os.path.join(cache_dir, '%s.pkl' % key)
+    tmp_fp = '%s.%i.tmp' % (fp, os.getpid())
+    with open(tmp_fp, 'wb') as f:
+        pickle.dump(hits, f, protocol=pickle.HIGHEST_PROTOCOL)
+        size = f.tell()
+    os.replace(tmp_fp, fp)
+
+    max_bytes = _CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    dir_key = os.path.abspath(cache_dir)
+    if dir_key in _CACHE_SIZES:
+        _CACHE_SIZES[dir_key] += size
+    else:
+        _CACHE_SIZES[dir_key] = None
+    if (_CACHE_SIZES[dir_key] is None) or (_CACHE_SIZES[dir_key] > max_bytes):
+        _CACHE_SIZES[dir_key] = _evict_cache(cache_dir, max_bytes)
+
+
+def _evict_cache(cache_dir, max_bytes):
+    """ Removes least recently used entries until cache_dir fits max_bytes.
+
+    Returns the total size of the remaining entries.
+    """
+    entries = []
+    for fp in glob(os.path.join(cache_dir, '*.pkl')):
+        try:
+            stat = os.stat(fp)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime_ns, stat.st_size, fp))
+
+    total = sum(entry[1] for entry in entries)
+    for _, size, fp in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(fp)
+        except OSError:
+            pass
+        total -= size
+    return total
+
+
+def _mmap_file(filename):
+    """ Memory maps a file for reading.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the HHsearch output file.
+
+    Returns
+    -------
+    mmap.mmap of the whole file.
+
+    Raises
+    ------
+    IOError
+        If the file cannot be read.
+    ValueError
+        If the file is empty, i.e. holds no HHsearch hit summary table.
+    """
+    try:
+        fh = open(filename, 'rb')
     except IOError:
         raise IOError('Cannot read file "%s"' % filename)
+    with fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            raise ValueError("No HHsearch hit summary table found.")
+        return mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _index_buffer(buf):
+    """ Parse the summary table and index the alignment blocks of a buffer.
+
+    Parameters
+    ----------
+    buf : bytes or mmap.mmap
+        Content of an HHsearch output file.
+
+    Returns
+    -------
+    ([dict], {int: (int, int)}), see index_pdb_match.
+    """
+    fh = buf if isinstance(buf, mmap.mmap) else io.BytesIO(buf)
+    fh.seek(0)
+    summaries = _read_hit_summaries(fh)
+
+    # find lines 'No N' that start alignment blocks
+    offsets = {}
+    number, start = None, None
+    pos, end = fh.tell(), len(buf)
+    while(pos < end):
+        if buf[pos:pos+3] != b'No ':
+            pos = buf.find(b'\nNo ', pos)
+            if pos == -1:
+                break
+            pos += 1
+        eol = buf.find(b'\n', pos)
+        eol = end if eol == -1 else eol + 1
+        fields = buf[pos:eol].split()
+        if len(fields) == 2:
+            if number is not None:
+                offsets[number] = (start, pos)
+            number, start = int(fields[1]), pos
+        pos = eol
+    if number is not None:
+        offsets[number] = (start, end)
+
+    return summaries, offsets
+
+
+def index_pdb_match(filename):
+    """ Parse the summary table and index the alignment blocks of a file.
+
+    Only the hit summary table of the HHsearch output is parsed. For the
+    alignment section, the byte offsets of each 'No N' block are recorded,
+    such that single blocks can later be parsed on demand via
+    read_hit_alignment. The file is memory mapped for scanning.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the HHsearch output file that should be indexed.
+        May be compressed or a member of a tar archive, see
+        parse_pdb_match.
 
+    Returns
+    -------
+    ([dict], {int: (int, int)}) where the first component is the list of hit
+    summaries, as returned by _parse_hit_summary_line, and the second maps
+    the hit index 'No' to the start and end byte offset of its alignment
+    block.
+
+    Raises
+    ------
+    IOError
+        If the file cannot be read.
+    """
+    with _read_buffer(filename) as buf:
+        return _index_buffer(buf)
+
+
+def read_hit_alignment(filename, offsets, summary=None, names=None):
+    """ Parse a single alignment block of an indexed HHsearch output file.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the HHsearch output file.
+    offsets : (int, int)
+        Start and end byte offset of the alignment block, as recorded by
+        index_pdb_match.
+    summary : dict
+        The according hit summary. If given, summary and alignment are merged
+        into one hit, just like the hits returned by parse_pdb_match.
+        Default: None, i.e. only the alignment block is returned.
+    names : tuple of str
+        Prefixes of the alignment line names to be included, see
+        _parse_hit_block. Default: None, i.e. all lines are included.
+
+    Returns
+    -------
+    A dict holding all information about the aligment, or about the hit if
+    summary is given.
 
-def select_hits(hits, e_value_threshold=0.001):
+    Raises
+    ------
+    IOError
+        If the file cannot be read.
+    """
+    if _is_plain_file(filename):
+        try:
+            with open(filename, 'rb') as fh:
+                fh.seek(offsets[0])
+                block = fh.read(offsets[1] - offsets[0])
+        except IOError:
+            raise IOError('Cannot read file "%s"' % filename)
+    else:
+        with _read_buffer(filename) as buf:
+            block = buf[offsets[0]:offsets[1]]
+    return _hit_from_block(block, summary, names)
+
+
+def _hit_from_block(block, summary=None, names=None):
+    """ Parse an alignment block and merge it with its summary, if given. """
+    hit = _parse_hit_block(block, names)
+    if summary is not None:
+        hit = _merge_hit(dict(summary), hit)
+    return hit
+
+
+def select_pdb_match(filename, min_prob=None, max_pvalue=None,
+                     max_evalue=None, min_fragment_length=0, min_identity=0,
+                     names=None, max_overlap=0):
+    """ Select non overlapping hits that satisfy all filters from a file.
+
+    Gives the same result as filtering the hits returned by parse_pdb_match
+    and passing them to select_hits, but works in two phases: first, the
+    summary table is parsed and the alignment blocks are indexed. Second,
+    only alignment blocks of those hits are parsed that might pass the filters
+    and do not overlap with a previously selected hit. Query positions of the
+    summary table are identical to those of the alignment blocks.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the HHsearch output file. May be compressed or a member of a
+        tar archive, see parse_pdb_match.
+    min_prob: float
+        Minimal probability of a hit to be selected.
+        Default: None, i.e. no filtering on probability.
+    max_pvalue: float
+        Maximal P-value of a hit to be selected.
+        Default: None, i.e. no filtering on P-value.
+    max_evalue: float
+        Maximal E-value of a hit to be selected.
+        Default: None, i.e. no filtering on E-value.
+    min_fragment_length: int
+        Minimal fragment length of a hit to be selected.
+        Default: 0, i.e. no filtering on fragment length.
+    min_identity: float
+        Minimum pair-wise sequence identity of a hit to be selected.
+        Default: 0, i.e. no filtering on sequence identity.
+    names : tuple of str
+        Prefixes of the alignment line names to be included, see
+        _parse_hit_block. Default: None, i.e. all lines are included.
+    max_overlap : int
+        Number of query positions a hit may share with any previously
+        selected hit, see select_hits. Default: 0.
+
+    Returns
+    -------
+    [dict] the selected HHsearch hits, in the order of the HHsearch output.
+
+    Raises
+    ------
+    IOError
+        If the file cannot be read.
+    """
+    with _read_buffer(filename) as buf:
+        return _select_buffer(buf, min_prob, max_pvalue, max_evalue,
+                              min_fragment_length, min_identity, names,
+                              max_overlap)
+
+
+def _select_buffer(buf, min_prob=None, max_pvalue=None, max_evalue=None,
+                   min_fragment_length=0, min_identity=0, names=None,
+                   max_overlap=0):
+    """ select_pdb_match for the content of an HHsearch output file.
+
+    Parameters
+    ----------
+    buf : bytes or mmap.mmap
+        Content of an HHsearch output file.
+    For all other parameters and the return value, see select_pdb_match.
+    """
+    summaries, offsets = _index_buffer(buf)
+    table = _summary_table(summaries)
+    # un-gapped query sub-sequence covers all positions of the query range
+    mask = _filter_mask(table, min_prob=min_prob, max_pvalue=max_pvalue,
+                        max_evalue=max_evalue,
+                        min_fragment_length=min_fragment_length,
+                        prob_tolerance=_PROB_TOLERANCE,
+                        evalue_tolerance=_EVALUE_TOLERANCE)
+
+    good_hits = []
+    good_ranges = _IntervalIndex()
+    for idx in np.flatnonzero(mask):
+        summary = summaries[idx]
+        q_range = (int(table['q_start'][idx]), int(table['q_end'][idx]))
+        if good_ranges.overlaps(*q_range, tolerance=max_overlap):
+            continue
+
+        start, end = offsets[summary[_HEADER[0]]]
+        hit = _hit_from_block(buf[start:end], summary, names)
+        if not _hit_passes(hit, min_prob, max_pvalue, max_evalue):
+            continue
+        if (min_identity is not None) and (hit['Identities'] < min_identity):
+            continue
+        good_hits.append(hit)
+        good_ranges.add(*q_range)
+
+    return good_hits
+
+
+def select_hits(hits, e_value_threshold=0.001, max_overlap=0):
     """ Picking HHsearch hits from the list of all hits.
 
     We take those hits that a) have an e-Value <= e_value_threshold and b)
@@ -306,28 +1401,24 @@ def select_hits(hits, e_value_threshold=0.001):
         The sorted list of hits from an HHsearch.
     e_value_threshold: float
         The threshold for a maximal e-Value for a hit to pick. Default: 0.001
+    max_overlap: int
+        Number of query positions a hit may share with any previously picked
+        hit. Default: 0, i.e. picked hits do not overlap.
 
     Returns
     -------
     [dict] a potentially smaller list of HHsearch hits.
     """
     good_hits = []
+    good_ranges = _IntervalIndex()
 
     for hit in hits:
         if hit['E-value'] < e_value_threshold:
-            id_hit = get_q_id(hit)
+            q_range = _q_range(hit)
             # check if there is an overlap to previous results
-            noOverlap = True
-            for good in good_hits:
-                id_good = get_q_id(good)
-                if is_overlapping((hit['alignment'][id_hit]['start'],
-                                   hit['alignment'][id_hit]['end']),
-                                  (good['alignment'][id_good]['start'],
-                                   good['alignment'][id_good]['end'])):
-                    noOverlap = False
-                    break
-            if noOverlap:
+            if not good_ranges.overlaps(*q_range, tolerance=max_overlap):
                 good_hits.append(hit)
+                good_ranges.add(*q_range)
 
     return good_hits
 
@@ -361,19 +1452,96 @@ def report_hits(hits):
     return report
 
 
-def report_uncovered_subsequences(hits, query, min_subseq_len=40):
+def coverage_mask(intervals, length):
+    """ Counts for each query position the number of covering intervals.
+
+    Parameters
+    ----------
+    intervals : iterable of (int, int)
+        Closed intervals of positions, starting with 1, e.g. the query ranges
+        of hits. Intervals may touch or overlap. Positions outside of 1 to
+        length are ignored.
+    length : int
+        Length of the query.
+
+    Returns
+    -------
+    numpy.ndarray of int, the coverage of the positions 1 to length.
+    """
+    intervals = np.asarray(list(intervals), dtype=np.int64).reshape(-1, 2)
+    starts = np.clip(intervals[:, 0] - 1, 0, length)
+    ends = np.clip(intervals[:, 1], 0, length)
+    valid = starts < ends
+
+    # +1 at the first, -1 after the last covered position of each interval
+    delta = np.zeros(length + 1, dtype=np.int64)
+    np.add.at(delta, starts[valid], 1)
+    np.add.at(delta, ends[valid], -1)
+    return np.cumsum(delta[:-1])
+
+
+def _runs(mask):
+    """ Start and end positions of runs of True in a boolean array.
+
+    Parameters
+    ----------
+    mask : numpy.ndarray of bool
+
+    Returns
+    -------
+    (numpy.ndarray, numpy.ndarray) of 0-based start and exclusive end
+    positions of the runs.
+    """
+    edges = np.flatnonzero(np.diff(np.concatenate(
+        ([False], mask, [False])).astype(np.int8)))
+    return edges[0::2], edges[1::2]
+
+
+def uncovered_intervals(intervals, length, min_gap=0):
+    """ Finds the stretches of a query not covered by any interval.
+
+    Parameters
+    ----------
+    intervals : iterable of (int, int)
+        Closed intervals of positions, starting with 1, see coverage_mask.
+    length : int
+        Length of the query.
+    min_gap : int
+        Uncovered stretches between two covered ones that are shorter than
+        min_gap are merged into the coverage. Stretches at either end of the
+        query are always reported.
+        Default: 0, i.e. no merging.
+
+    Returns
+    -------
+    [(int, int)] closed intervals of uncovered positions, starting with 1,
+    sorted by position.
+    """
+    uncovered = coverage_mask(intervals, length) == 0
+    starts, ends = _runs(uncovered)
+    if min_gap > 0:
+        keep = ((ends - starts) >= min_gap) | (starts == 0) | (ends == length)
+        starts, ends = starts[keep], ends[keep]
+    return [(int(start) + 1, int(end)) for start, end in zip(starts, ends)]
+
+
+def report_uncovered_subsequences(hits, query, min_subseq_len=40, min_gap=0):
     """ Returns sub-sequences of query that is not covered by hits.
 
     Parameters
     ----------
     hits : [dict]
-        A list of HHsearch hits.
+        A list of HHsearch hits. Query ranges of hits may touch or overlap.
     query : str
         The protein sequence that was used to generate the HHsearch hits, i.e.
         the content of the input file for HHsearch.
     min_subseq_len : int
         A threhold for the minimal sub-sequence length that should be reported.
         Default = 40
+    min_gap : int
+        Gaps between two hits that are shorter than min_gap are considered as
+        covered, see uncovered_intervals.
+        Default = 0, i.e. no merging.
 
     Returns
     -------
@@ -384,28 +1552,11 @@ def report_uncovered_subsequences(hits, query, min_subseq_len=40):
     relative to the query sequence and c) 'end' the relative end position.
     (positions start with 1, not with 0)
     """
-    covered = []
-    for hit in hits:
-        # find the right key for the query sequence information
-        q_keys = get_q_id(hit)
-        covered.append((hit['alignment'][q_keys]['start'],
-                        hit['alignment'][q_keys]['end']))
-
-    uncovered = []
-    curEnd = 0
-    for sub in sorted(covered):
-        unc = {'sequence': query[curEnd:sub[0]-1],
-               'start': curEnd+1,
-               'end': sub[0]-1}
-        uncovered.append(unc)
-        curEnd = sub[1]
-    unc = {'sequence': query[curEnd:],
-           'start': curEnd+1,
-           'end': len(query)}
-    uncovered.append(unc)
-
-    return [u for u in uncovered if (u['sequence'] != '') &
-                                    (len(u['sequence']) >= min_subseq_len)]
+    uncovered = uncovered_intervals((_q_range(hit) for hit in hits),
+                                    len(query), min_gap=min_gap)
+    return [{'sequence': query[start-1:end], 'start': start, 'end': end}
+            for start, end in uncovered
+            if end - start + 1 >= min_subseq_len]
 
 
 def get_q_id(hit):
@@ -430,12 +1581,42 @@ def get_q_id(hit):
     We assume that there are only two line names starting with 'Q '.
     """
     # find the right ID
-    _id = [_id for _id in hit['alignment'].keys()
-           if _id.startswith('Q') and
-           _id != 'Q Consensus'][0]
+    _id = [_id for _id in hit['alignment'].keys() if _is_q_id(_id)][0]
     return _id
 
 
+def _is_q_id(key):
+    """ Tests if an alignment line name is the query ID, see get_q_id. """
+    return key.startswith('Q') and key != 'Q Consensus'
+
+
+def _q_range(hit):
+    """ Returns start and end position of the query for a parsed hit.
+
+    Hits without a query alignment line fall back to the query range of the
+    summary table, see _merge_hit.
+    """
+    if isinstance(hit, Hit):
+        return hit.q_start, hit.q_end
+    if _HEADER[8] in hit:
+        return _summary_range(hit[_HEADER[8]])
+    q = hit['alignment'][get_q_id(hit)]
+    return q['start'], q['end']
+
+
+def _q_sequence(hit):
+    """ Returns the aligned, gapped query sequence of a parsed hit.
+
+    None for hits without a query alignment line, see _merge_hit, or without
+    sequence, see parse_blasttab.
+    """
+    if isinstance(hit, Hit):
+        return hit.q_sequence
+    if _HEADER[8] in hit:
+        return None
+    return hit['alignment'][get_q_id(hit)].get('sequence')
+
+
 def frag_size(hit):
     """ Compute the fragment length of a hit.
 
@@ -449,6 +1630,10 @@ def frag_size(hit):
     Returns
     -------
     The length of the un-gapped sequence for the given hit."""
+    if _HEADER[8] in hit:
+        # no query alignment line, see _merge_hit
+        start, end = _q_range(hit)
+        return end - start + 1
     # find the right ID
     _id = get_q_id(hit)
     subseq = hit['alignment'][_id]['sequence']
@@ -508,7 +1693,9 @@ def correct_header_positions(header, new_start, new_end, out=sys.stderr):
 
 def mask_sequence(hhsuite_fp, fullsequence_fp, subsequences_fp=None,
                   min_prob=None, max_pvalue=None, max_evalue=None,
-                  min_fragment_length=0, min_identity=0):
+                  min_fragment_length=0, min_identity=0, cache_dir=None,
+                  min_gap=0, max_overlap=0, blasttab=False,
+                  percent_identity=False):
     """ Splits a protein sequence according to HHsuits results.
 
     The returned sub-sequences will seamlessly build the full sequence if
@@ -517,9 +1704,12 @@ def mask_sequence(hhsuite_fp, fullsequence_fp, subsequences_fp=None,
     Parameters
     ----------
     hhsuite_fp : str
-        Filepath to HHblits/HHsearch output.
+        Filepath to HHblits/HHsearch output. Compressed files (.gz, .bz2, .xz)
+        and members of tar archives, given as path of the archive followed by
+        the path of the member, are read without extraction to disk.
     fullsequence_fp : str
-        Filepath to the protein sequence of the original query.
+        Filepath to the protein sequence of the original query. May be
+        compressed or a member of a tar archive, just as hhsuite_fp.
     subsequences_fp : str
         Filepath to which sub-sequences are written as a multiple fasta file.
         Each sequence makes up one header and one sequence file, i.e. sequences
@@ -545,6 +1735,30 @@ def mask_sequence(hhsuite_fp, fullsequence_fp, subsequences_fp=None,
         Minimum pair-wise sequence identity of a hit to be included in the
         resulting list.
         Default: 0, i.e. no filtering on sequence identity.
+    cache_dir : str
+        Directory of a cache for parsed hits, see parse_pdb_match. Useful when
+        splitting the same HHsuite results repeatedly with different
+        filtering options.
+        Default: None, i.e. no caching.
+    min_gap : int
+        Gaps between two hits that are shorter than min_gap are not reported
+        as non matching sub-sequences, see uncovered_intervals.
+        Default: 0, i.e. no merging.
+    max_overlap : int
+        Number of query positions a hit may share with any previously selected
+        hit, see select_hits.
+        Default: 0, i.e. hits do not overlap.
+    blasttab : bool
+        If True, hhsuite_fp is tabular HH-suite output, see parse_blasttab.
+        Positions, E-values and identities are taken from the table and
+        sub-sequences of hits are cut from the query sequence. Since the table
+        holds neither probabilities nor P-values, min_prob and max_pvalue
+        cannot be used.
+        Default: False, i.e. hhsuite_fp is regular HH-suite output.
+    percent_identity : bool
+        If True, identities of tabular input are percentages, as in BLAST's m8
+        format, see parse_blasttab. Ignored unless blasttab is True.
+        Default: False, i.e. identities are fractions.
 
     Returns
     -------
@@ -555,6 +1769,8 @@ def mask_sequence(hhsuite_fp, fullsequence_fp, subsequences_fp=None,
     ------
     IOError
         If the file cannot be written.
+    ValueError
+        If min_prob or max_pvalue is used with tabular input.
 
     Notes
     -----
@@ -562,71 +1778,546 @@ def mask_sequence(hhsuite_fp, fullsequence_fp, subsequences_fp=None,
     min_fragment_length) to be included in the resulting list.
     """
 
-    # parse hits from file
-    hits = parse_pdb_match(hhsuite_fp)
-
-    # filter hits
-    if min_prob is not None:
-        hits = [hit for hit in hits if hit['Probab'] >= min_prob]
-    if max_pvalue is not None:
-        hits = [hit for hit in hits if hit['P-value'] <= max_pvalue]
-    if max_evalue is not None:
-        hits = [hit for hit in hits if hit['E-value'] <= max_evalue]
-    if min_fragment_length is not None:
-        hits = [hit for hit in hits if frag_size(hit) >= min_fragment_length]
-    if min_identity is not None:
-        hits = [hit for hit in hits if hit['Identities'] >= min_identity]
+    if blasttab and ((min_prob is not None) or (max_pvalue is not None)):
+        raise ValueError('Tabular HH-suite output holds neither '
+                         'probabilities nor P-values.')
 
     # read the original protein file, used to run HHsearch
-    p = Protein.read(fullsequence_fp, seq_num=1)
-    query_id = p.metadata['id']
-    query_desc = p.metadata['description']
+    # skbio sniffs formats, which needs a seekable file
+    with _open_binary(fullsequence_fp) as fh:
+        p = Protein.read(io.BytesIO(fh.read()), seq_num=1)
+
+    if blasttab:
+        # filter all tabular hits and select non overlapping positive hits
+        hits = filter_hits(parse_blasttab(hhsuite_fp,
+                                          percent_identity=percent_identity),
+                           max_evalue=max_evalue,
+                           min_fragment_length=min_fragment_length,
+                           min_identity=min_identity)
+        subseqs_pos = select_hits(hits, e_value_threshold=999999,
+                                  max_overlap=max_overlap)
+        for hit in subseqs_pos:
+            q = hit['alignment'][get_q_id(hit)]
+            q['sequence'] = str(p)[q['start']-1:q['end']]
+    elif cache_dir is not None:
+        # filter all (cached) hits and select non overlapping positive hits
+        hits = filter_hits(parse_pdb_match(hhsuite_fp, cache_dir=cache_dir,
+                                           as_hits=True),
+                           min_prob=min_prob, max_pvalue=max_pvalue,
+                           max_evalue=max_evalue,
+                           min_fragment_length=min_fragment_length,
+                           min_identity=min_identity)
+        subseqs_pos = select_hits(hits, e_value_threshold=999999,
+                                  max_overlap=max_overlap)
+    else:
+        # select non overlapping positive hits, only parsing alignments of
+        # hits that might survive filtering and selection
+        subseqs_pos = select_pdb_match(hhsuite_fp, min_prob=min_prob,
+                                       max_pvalue=max_pvalue,
+                                       max_evalue=max_evalue,
+                                       min_fragment_length=min_fragment_length,
+                                       min_identity=min_identity,
+                                       names=('Q ', ),
+                                       max_overlap=max_overlap)
+
+    results = _split_query(subseqs_pos, p, min_fragment_length, min_gap)
 
-    results = {'match': [], 'non_match': []}
-    # select non overlapping positive hits
-    subseqs_pos = select_hits(hits, e_value_threshold=999999)
+    # write sub-sequences to a multiple fasta file, sequences are un-wrapped
+    if subsequences_fp is not None:
+        write_subsequences(results, subsequences_fp)
+
+    return results
+
+
+def _split_query(hits, p, min_fragment_length=0, min_gap=0):
+    """ Splits the query into sub-sequences of hits and the gaps between.
+
+    Parameters
+    ----------
+    hits : [dict]
+        Non overlapping hits, e.g. as returned by select_pdb_match.
+    p : skbio.Protein
+        The full query sequence, with metadata 'id' and 'description'.
+    min_fragment_length : int
+        Minimal length of a gap between hits to be reported.
+    min_gap : int
+        Gaps between two hits shorter than min_gap are merged into the
+        coverage, see uncovered_intervals.
+
+    Returns
+    -------
+    {str: [(str, str)]}, see mask_sequence.
+    """
+    fragments = _fragments(hits, p.metadata['id'], p.metadata['description'],
+                           str(p), min_fragment_length, min_gap)
+    return {type_: [frag[:2] for frag in fragments[type_]]
+            for type_ in fragments}
 
-    for hit in subseqs_pos:
-        _id = get_q_id(hit)
+
+def _fragments(hits, query_id, query_desc, query, min_fragment_length=0,
+               min_gap=0):
+    """ Collects the sub-sequences of hits and the gaps between.
+
+    Parameters
+    ----------
+    hits : [dict] or [Hit]
+        Non overlapping hits, e.g. as returned by select_pdb_match.
+    query_id : str
+        Identifier of the query, i.e. its fasta header up to the first space.
+    query_desc : str
+        Description of the query, i.e. the rest of its fasta header.
+    query : str
+        The full query sequence.
+    min_fragment_length : int
+        Minimal length of a gap between hits to be reported.
+    min_gap : int
+        Gaps between two hits shorter than min_gap are merged into the
+        coverage, see uncovered_intervals.
+
+    Returns
+    -------
+    {str: [(str, str, int, int)]} for the keys 'match' and 'non_match', the
+    fasta header, sequence, start and end position of the sub-sequences,
+    sorted by start position.
+    """
+    results = {'match': [], 'non_match': []}
+    for hit in hits:
         match_id = hit['Hit'].split()[0]
+        start, end = _q_range(hit)
         header = "%s %s %s" % (correct_header_positions(
-            query_id,
-            hit['alignment'][_id]['start'],
-            hit['alignment'][_id]['end']), '# %s' % match_id, query_desc)
-        seq = hit['alignment'][_id]['sequence'].replace('-', '')
-        results['match'].append((header, seq, hit['alignment'][_id]['start']))
+            query_id, start, end), '# %s' % match_id, query_desc)
+        seq = _q_sequence(hit)
+        if seq is None:
+            # no query alignment line, cut the hit's range from the query
+            seq = query[start-1:end]
+        results['match'].append((header, seq.replace('-', ''), start, end))
 
     # collect gaps between positive hits
-    subseqs_neg = report_uncovered_subsequences(subseqs_pos, str(p),
-                                                min_fragment_length)
+    subseqs_neg = report_uncovered_subsequences(hits, query,
+                                                min_fragment_length,
+                                                min_gap=min_gap)
     for hit in subseqs_neg:
         header = "%s %s" % (correct_header_positions(
             query_id,
             hit['start'],
             hit['end']), query_desc)
         seq = hit['sequence']
-        results['non_match'].append((header, seq, hit['start']))
+        results['non_match'].append((header, seq, hit['start'], hit['end']))
 
-    # write sub-sequences to a multiple fasta file, sequences are un-wrapped
+    # sort by start position
+    return {type_: sorted(results[type_], key=lambda x: x[2])
+            for type_ in results}
+
+
+def mask_hits(hits, query, header=None, subsequences_fp=None, min_prob=None,
+              max_pvalue=None, max_evalue=None, min_fragment_length=0,
+              min_identity=0, min_gap=0, max_overlap=0):
+    """ Splits an in-memory protein sequence according to parsed hits.
+
+    Same as mask_sequence, but neither hits nor query are read from files and
+    sub-sequences are returned as skbio.Protein objects, e.g. to be passed on
+    to process_fasta.split_fasta or the next HHsuite search.
+
+    Parameters
+    ----------
+    hits : [dict]
+        HHsearch hits, e.g. as returned by parse_pdb_match.
+    query : str or skbio.Protein
+        The protein sequence that was used to generate the HHsearch hits.
+    header : str
+        Fasta header of query, i.e. its identifier followed by an optional
+        description. Only used if query is a str, otherwise the metadata of
+        query are used.
+        Default: None, i.e. an empty identifier.
+    subsequences_fp : str
+        Filepath to which sub-sequences are written, see write_subsequences.
+        Default: None, i.e. no file is written.
+    min_prob, max_pvalue, max_evalue, min_fragment_length, min_identity,
+    min_gap, max_overlap :
+        Filtering and selection options, see mask_sequence.
+
+    Returns
+    -------
+    {str: [skbio.Protein]} for the keys 'match' and 'non_match', the
+    sub-sequences of hits and of the gaps between hits, sorted by start
+    position. Metadata 'id' and 'description' form the fasta header, 'start'
+    and 'end' give the position of the sub-sequence within query (starting
+    with 1).
+
+    Raises
+    ------
+    IOError
+        If the file cannot be written.
+    """
+    if isinstance(query, Protein):
+        query_id = query.metadata.get('id', '')
+        query_desc = query.metadata.get('description', '')
+        query = str(query)
+    else:
+        fields = (header or '').lstrip('>').strip().split(None, 1)
+        query_id = fields[0] if len(fields) > 0 else ''
+        query_desc = fields[1] if len(fields) > 1 else ''
+
+    hits = filter_hits(hits, min_prob=min_prob, max_pvalue=max_pvalue,
+                       max_evalue=max_evalue,
+                       min_fragment_length=min_fragment_length,
+                       min_identity=min_identity)
+    hits = select_hits(hits, e_value_threshold=999999,
+                       max_overlap=max_overlap)
+    fragments = _fragments(hits, query_id, query_desc, query,
+                           min_fragment_length, min_gap)
+
+    if subsequences_fp is not None:
+        write_subsequences({type_: [frag[:2] for frag in fragments[type_]]
+                            for type_ in fragments}, subsequences_fp)
+
+    results = {}
+    for type_ in fragments:
+        results[type_] = []
+        for header, seq, start, end in fragments[type_]:
+            frag_id, frag_desc = header.split(' ', 1)
+            results[type_].append(Protein(seq, metadata={
+                'id': frag_id, 'description': frag_desc.strip(),
+                'start': start, 'end': end}))
+    return results
+
+
+def write_subsequences(results, subsequences_fp):
+    """ Writes sub-sequences of mask_sequence into multiple fasta files.
+
+    Parameters
+    ----------
+    results : {str: [(str, str)]}
+        The result of mask_sequence, i.e. for the keys 'match' and
+        'non_match' a list of fasta header and sequence pairs.
+    subsequences_fp : str
+        Filepath to which sub-sequences are written. Two files will be
+        produced, suffixed by '.match' and '.non_match'. Sequences are not
+        wrapped.
+
+    Raises
+    ------
+    IOError
+        If the file cannot be written.
+    """
     try:
-        # sort by start position
         for type_ in results:
-            results[type_] = sorted(results[type_], key=lambda x: x[2])
-
-        if subsequences_fp is not None:
-            for type_ in results:
-                f = open('%s.%s' % (subsequences_fp, type_), 'w')
+            with open('%s.%s' % (subsequences_fp, type_), 'w') as f:
                 for res in results[type_]:
                     f.write(">%s\n%s\n" % res[:2])
-                f.close()
-
-        # removing the start position component from all subsequences
-        return {type_: list(map(lambda x: x[:2], results[type_]))
-                for type_ in results}
     except IOError:
         raise IOError('Cannot write to file "%s"' % subsequences_fp)
 
 
+def find_search_pairs(path, extension='.out'):
+    """ Collects pairs of HHsearch output and query fasta files.
+
+    Parameters
+    ----------
+    path : str
+        Either a directory or a manifest file. For a directory, every
+        '*.fasta' file with an according '*.out' file, i.e. same name but file
+        extension, forms a pair. A manifest lists one pair per line, HHsearch
+        output filepath first, query fasta filepath second, separated by
+        whitespace. Empty lines and lines starting with '#' are ignored.
+    extension : str
+        File extension of HHsearch output files in a directory, e.g. '.m8'
+        for tabular output, see parse_blasttab. Ignored for manifests.
+        Default: '.out'
+
+    Returns
+    -------
+    [(str, str)] pairs of HHsearch output and query fasta filepaths, sorted
+    by output filepath for directories, in manifest order otherwise.
+
+    Raises
+    ------
+    ValueError
+        If a manifest line does not hold exactly two filepaths.
+    """
+    if os.path.isdir(path):
+        pairs = []
+        for fasta_fp in glob(os.path.join(path, '*.fasta')):
+            hh_fp = re.sub(r'\.fasta$', extension, fasta_fp)
+            if os.path.exists(hh_fp):
+                pairs.append((hh_fp, fasta_fp))
+        return sorted(pairs)
+
+    pairs = []
+    with open(path, 'r') as f:
+        for line in f:
+            if (line.strip() == '') or line.startswith('#'):
+                continue
+            fields = line.split()
+            if len(fields) != 2:
+                raise ValueError('Manifest line "%s" must hold exactly two '
+                                 'filepaths.' % line.rstrip())
+            pairs.append(tuple(fields))
+    return pairs
+
+
+def _mask_sequence_pair(args):
+    """ Calls mask_sequence for one pair, for use with Pool.imap. """
+    hh_fp, fasta_fp, kwargs = args
+    return mask_sequence(hh_fp, fasta_fp, **kwargs)
+
+
+def mask_sequences(pairs, outdir=None, n_jobs=1, **kwargs):
+    """ Splits many protein sequences according to their HHsuite results.
+
+    Parameters
+    ----------
+    pairs : [(str, str)]
+        Pairs of HHblits/HHsearch output and query fasta filepaths, e.g. as
+        returned by find_search_pairs.
+    outdir : str
+        Directory into which sub-sequences are written. For each pair, files
+        '<name>.match' and '<name>.non_match' are produced, where <name> is
+        the filename of the HHsuite output without its extension.
+        Default: None, i.e. no file is written.
+    n_jobs : int
+        Number of worker processes. Default: 1, i.e. no worker processes.
+    kwargs :
+        Options passed to mask_sequence, i.e. min_prob, max_pvalue,
+        max_evalue, min_fragment_length, min_identity, cache_dir, min_gap,
+        max_overlap, blasttab and percent_identity.
+
+    Returns
+    -------
+    [{str: [(str, str)]}] the result of mask_sequence for each pair, in the
+    order of pairs.
+
+    Raises
+    ------
+    IOError
+        If a file cannot be read or written.
+    """
+    tasks = [(hh_fp, fasta_fp, kwargs) for hh_fp, fasta_fp in pairs]
+    if n_jobs > 1:
+        with Pool(n_jobs) as pool:
+            results = pool.map(_mask_sequence_pair, tasks)
+    else:
+        results = list(map(_mask_sequence_pair, tasks))
+
+    if outdir is not None:
+        if not os.path.exists(outdir):
+            os.makedirs(outdir)
+        for (hh_fp, _), result in zip(pairs, results):
+            name = os.path.splitext(os.path.basename(hh_fp))[0]
+            write_subsequences(result, os.path.join(outdir, name))
+
+    return results
+
+
+def _ffindex_fps(prefix):
+    """ Returns the data and index filepaths of an ffindex database.
+
+    Parameters
+    ----------
+    prefix : str
+        Filepath of the database without extension, or of either its
+        '.ffdata' or '.ffindex' file.
+
+    Returns
+    -------
+    (str, str) filepaths of the '.ffdata' and the '.ffindex' file.
+    """
+    prefix = re.sub(r'\.(ffdata|ffindex)$', '', prefix)
+    return '%s.ffdata' % prefix, '%s.ffindex' % prefix
+
+
+def read_ffindex(index_fp):
+    """ Reads the index of an HH-suite ffindex database.
+
+    Parameters
+    ----------
+    index_fp : str
+        Filepath to the '.ffindex' file. Each line holds the name of an entry,
+        its byte offset and length in the '.ffdata' file, tab separated.
+
+    Returns
+    -------
+    OrderedDict {str: (int, int)} mapping entry names to their offset and
+    length, in the order of the index.
+
+    Raises
+    ------
+    IOError
+        If the file cannot be read.
+    ValueError
+        If a line does not hold exactly three fields.
+    """
+    index = OrderedDict()
+    try:
+        fh = open(index_fp, 'r')
+    except IOError:
+        raise IOError('Cannot read file "%s"' % index_fp)
+    with fh:
+        for line in fh:
+            if line.strip() == '':
+                continue
+            fields = line.split('\t')
+            if len(fields) != 3:
+                raise ValueError('ffindex line "%s" must hold exactly three '
+                                 'fields.' % line.rstrip())
+            index[fields[0]] = (int(fields[1]), int(fields[2]))
+    return index
+
+
+class FFindexDB(object):
+    """ Random access to the entries of an HH-suite ffindex/ffdata database.
+
+    HH-suite batch runs, e.g. hhsearch_omp or hhblits_mpi, write the results
+    of all queries into one '.ffdata' file, indexed by an '.ffindex' file.
+    The data file is memory mapped, entries are returned as bytes.
+
+    Parameters
+    ----------
+    prefix : str
+        Filepath of the database, see _ffindex_fps.
+
+    Raises
+    ------
+    IOError
+        If the database cannot be read.
+    """
+    def __init__(self, prefix):
+        self.data_fp, self.index_fp = _ffindex_fps(prefix)
+        self.index = read_ffindex(self.index_fp)
+        try:
+            fh = open(self.data_fp, 'rb')
+        except IOError:
+            raise IOError('Cannot read file "%s"' % self.data_fp)
+        with fh:
+            if os.fstat(fh.fileno()).st_size == 0:
+                self._data = b''
+            else:
+                self._data = mmap.mmap(fh.fileno(), 0,
+                                       access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __getitem__(self, name):
+        offset, length = self.index[name]
+        # entries are terminated by a null byte
+        return self._data[offset:offset + length].rstrip(b'\0')
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _read_query(entry):
+    """ Reads the query sequence from a fasta or a3m database entry.
+
+    Parameters
+    ----------
+    entry : bytes
+        A database entry, whose first sequence is the query. Leading comment
+        lines, starting with '#' as in a3m files, are skipped.
+
+    Returns
+    -------
+    skbio.Protein
+    """
+    while entry.startswith(b'#'):
+        entry = entry[entry.find(b'\n') + 1:]
+    return Protein.read(io.BytesIO(entry), format='fasta', seq_num=1)
+
+
+def _mask_ffindex_chunk(args):
+    """ Splits the queries of some entries, for use with Pool.imap. """
+    result_db, sequence_db, names, kwargs = args
+    min_fragment_length = kwargs.get('min_fragment_length', 0)
+    results = []
+    with FFindexDB(result_db) as hhdb, FFindexDB(sequence_db) as seqdb:
+        for name in names:
+            hits = _select_buffer(hhdb[name],
+                                  min_prob=kwargs.get('min_prob'),
+                                  max_pvalue=kwargs.get('max_pvalue'),
+                                  max_evalue=kwargs.get('max_evalue'),
+                                  min_fragment_length=min_fragment_length,
+                                  min_identity=kwargs.get('min_identity', 0),
+                                  names=('Q ', ),
+                                  max_overlap=kwargs.get('max_overlap', 0))
+            results.append(_split_query(hits, _read_query(seqdb[name]),
+                                        min_fragment_length,
+                                        kwargs.get('min_gap', 0)))
+    return results
+
+
+def mask_ffindex(result_db, sequence_db, subsequences_fp=None, n_jobs=1,
+                 **kwargs):
+    """ Splits all queries of an HH-suite ffindex result database.
+
+    Parameters
+    ----------
+    result_db : str
+        Filepath of the ffindex database holding the HHblits/HHsearch output
+        of all queries, see _ffindex_fps.
+    sequence_db : str
+        Filepath of the ffindex database of query sequences, as used to run
+        HH-suite. Entries are fasta or a3m, the first sequence being the
+        query, and are named as the entries of result_db.
+    subsequences_fp : str
+        Filepath to which the sub-sequences of all queries are written, see
+        write_subsequences. Default: None, i.e. no file is written.
+    n_jobs : int
+        Number of worker processes. Entries are split into contiguous chunks,
+        each worker maps the databases itself.
+        Default: 1, i.e. no worker processes.
+    kwargs :
+        Filtering options, as for mask_sequence, i.e. min_prob, max_pvalue,
+        max_evalue, min_fragment_length, min_identity, min_gap and
+        max_overlap.
+
+    Returns
+    -------
+    OrderedDict {str: {str: [(str, str)]}} the result of mask_sequence for
+    each entry name, in the order of the result database index.
+
+    Raises
+    ------
+    IOError
+        If a database cannot be read or the file cannot be written.
+    KeyError
+        If the query sequence of an entry is missing in sequence_db.
+    """
+    names = list(read_ffindex(_ffindex_fps(result_db)[1]))
+    chunk_size = max(1, -(-len(names) // (max(1, n_jobs) * 4)))
+    tasks = [(result_db, sequence_db, names[i:i + chunk_size], kwargs)
+             for i in range(0, len(names), chunk_size)]
+    if n_jobs > 1:
+        with Pool(n_jobs) as pool:
+            chunks = pool.map(_mask_ffindex_chunk, tasks)
+    else:
+        chunks = list(map(_mask_ffindex_chunk, tasks))
+    results = OrderedDict(zip(names, [res for chunk in chunks
+                                      for res in chunk]))
+
+    if subsequences_fp is not None:
+        # write fragments of all queries at once
+        write_subsequences({type_: [subseq for result in results.values()
+                                    for subseq in result[type_]]
+                            for type_ in ('match', 'non_match')},
+                           subsequences_fp)
+
+    return results
+
+
 def pretty_output(mask_out):
     for key in sorted(mask_out.keys()):
         print(key)
@@ -655,13 +2346,96 @@ def pretty_output(mask_out):
               help='Maximum P-value')
 @click.option('--identity', '-i', default=0, type=float,
               help='Minimum pair-wise sequence identity')
-@click.argument('hh_fp', nargs=1, type=click.Path(exists=True))
-@click.argument('fullseq_fp', nargs=1, type=click.Path(exists=True))
+@click.option('--min_gap', '-g', default=0, type=int,
+              help='Gaps between hits shorter than this are not reported \
+              as non matching sub-sequences')
+@click.option('--blasttab', is_flag=True,
+              help='HH_FP is tabular HH-suite output, written with option \
+              "-blasttab". Probabilities and P-values are not available. \
+              With --batch, directories pair *.fasta with *.m8 files.')
+@click.option('--percent_identity', is_flag=True,
+              help='Identities of tabular input are percentages, as in \
+              BLAST\'s m8 format, rather than fractions')
+@click.option('--max_overlap', default=0, type=int,
+              help='Number of positions a hit may share with a previously \
+              selected hit')
+@click.option('--batch', '-b', default=None,
+              type=click.Path(exists=True),
+              help='Directory or manifest file of pairs of HHsuite output \
+              and query fasta files to process in one run. Replaces \
+              arguments HH_FP and FULLSEQ_FP. Output root ''-o'' then is a \
+              directory.')
+@click.option('--threads', '-t', default=1, type=int,
+              help='Number of worker processes in batch and ffindex mode')
+@click.option('--cache_dir', '-c', default=None, type=click.Path(),
+              help='Directory to cache parsed HHsuite results in')
+@click.option('--ffindex', '-f', default=None, nargs=2,
+              type=click.Path(),
+              help='Result and query sequence ffindex databases of an \
+              HH-suite batch run, e.g. "hhsearch_omp". Replaces arguments \
+              HH_FP and FULLSEQ_FP. Sub-sequences of all queries are \
+              written into one pair of output files.')
+@click.argument('hh_fp', nargs=1, type=click.Path(exists=True),
+                required=False)
+@click.argument('fullseq_fp', nargs=1, type=click.Path(exists=True),
+                required=False)
 def _split_search(hh_fp, fullseq_fp, subseq_fp,
                   prob,
                   p_val,
                   e_val,
-                  frag_len, identity):
+                  frag_len, identity, batch, threads, cache_dir, ffindex,
+                  min_gap, max_overlap, blasttab, percent_identity):
+
+    if percent_identity and not blasttab:
+        raise click.UsageError('--percent_identity needs --blasttab.')
+
+    if ffindex is not None:
+        if blasttab:
+            raise click.UsageError('--blasttab cannot be used with '
+                                   '--ffindex, whose result database holds '
+                                   'regular HH-suite output.')
+        if cache_dir is not None:
+            raise click.UsageError('--cache_dir cannot be used with '
+                                   '--ffindex, whose entries are parsed '
+                                   'from the mapped result database.')
+        _outs = mask_ffindex(ffindex[0], ffindex[1],
+                             subsequences_fp=subseq_fp,
+                             n_jobs=threads,
+                             min_prob=prob,
+                             max_pvalue=p_val,
+                             max_evalue=e_val,
+                             min_fragment_length=frag_len,
+                             min_identity=identity,
+                             min_gap=min_gap,
+                             max_overlap=max_overlap)
+        if subseq_fp is None:
+            for _out in _outs.values():
+                pretty_output(_out)
+        return
+
+    if batch is not None:
+        extension = '.m8' if blasttab else '.out'
+        _outs = mask_sequences(find_search_pairs(batch, extension),
+                               outdir=subseq_fp,
+                               n_jobs=threads,
+                               min_prob=prob,
+                               max_pvalue=p_val,
+                               max_evalue=e_val,
+                               min_fragment_length=frag_len,
+                               min_identity=identity,
+                               cache_dir=cache_dir,
+                               min_gap=min_gap,
+                               max_overlap=max_overlap,
+                               blasttab=blasttab,
+                               percent_identity=percent_identity)
+        if subseq_fp is None:
+            for _out in _outs:
+                pretty_output(_out)
+        return
+
+    if (hh_fp is None) or (fullseq_fp is None):
+        raise click.UsageError('Provide HH_FP and FULLSEQ_FP, --batch or '
+                               '--ffindex.')
 
     _out = mask_sequence(hh_fp,
                          fullseq_fp,
@@ -669,7 +2443,12 @@ def _split_search(hh_fp, fullseq_fp, subseq_fp,
                          prob,
                          p_val,
                          e_val,
-                         frag_len, min_identity=identity)
+                         frag_len, min_identity=identity,
+                         cache_dir=cache_dir,
+                         min_gap=min_gap,
+                         max_overlap=max_overlap,
+                         blasttab=blasttab,
+                         percent_identity=percent_identity)
 
     if subseq_fp is None:
         pretty_output(_out)
@@ -1,12 +1,33 @@
 from unittest import TestCase, main
 from skbio.util import get_data_path
+from contextlib import redirect_stdout
+import tempfile
+import shutil
+import gzip
 import re
+import os
+import io
+
+import numpy as np
 
 from microprot.scripts.contacts import _topN_contacts
 from microprot.scripts.contacts import (read_PDB_coordinates,
+                                        read_PDB_arrays,
+                                        read_PDB_atoms,
+                                        read_PDB_models,
                                         read_contact_predictions,
                                         find_PDB_contacts,
-                                        contact_precision)
+                                        contact_map,
+                                        write_contact_map,
+                                        read_contact_map,
+                                        contact_precision,
+                                        find_ensemble_contacts,
+                                        ensemble_precision,
+                                        contact_metrics,
+                                        precision_table,
+                                        find_prediction_files,
+                                        batch_precision,
+                                        write_summary)
 
 
 class ContactsTests(TestCase):
@@ -35,6 +56,10 @@ class ContactsTests(TestCase):
             {'-t': 'lr', '-l': 10},
             {'-t': 'sr', '-l': 2},
             {'-t': 'sr', '-l': 10}]
+        self.tmpdir = tempfile.mkdtemp(prefix='contacts_')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
 
     def test_read_PDB(self):
         for inp_fp, n_res in zip([self.jbe_pdb, self.qjp_pdb], [126, 137]):
@@ -43,6 +68,173 @@ class ContactsTests(TestCase):
             self.assertEqual(len(out), n_res)
             self.assertEqual(len(out[0]), 4)
 
+    def test_read_PDB_arrays(self):
+        exp = read_PDB_coordinates(open(self.jbe_pdb, 'r'))
+        resids, xyz = read_PDB_arrays(self.jbe_pdb)
+        self.assertEqual(resids.tolist(), [c[0] for c in exp])
+        self.assertEqual(xyz.tolist(), [c[1:] for c in exp])
+        self.assertEqual(xyz.shape, (126, 3))
+        self.assertEqual(xyz[0].tolist(), [38.252, 20.159, 8.568])
+
+        # binary handles and gzip compressed files
+        obs = read_PDB_arrays(open(self.jbe_pdb, 'rb'))
+        self.assertEqual(obs[0].tolist(), resids.tolist())
+        gz_fp = os.path.join(self.tmpdir, 'pdb1jbe.ent.gz')
+        with open(self.jbe_pdb, 'rb') as f_in, gzip.open(gz_fp, 'wb') as f:
+            f.write(f_in.read())
+        obs = read_PDB_arrays(gz_fp)
+        self.assertEqual(obs[0].tolist(), resids.tolist())
+        self.assertEqual(obs[1].tolist(), xyz.tolist())
+
+        # chains
+        pdb_fp = get_data_path('test_contacts/2vt4_exp.pdb')
+        resids, xyz = read_PDB_arrays(pdb_fp)
+        chains = [read_PDB_arrays(pdb_fp, chain=chain)[0]
+                  for chain in 'ABCD']
+        self.assertEqual(sum(len(c) for c in chains), len(resids))
+        self.assertEqual(len(read_PDB_arrays(pdb_fp, chain='X')[0]), 0)
+
+        # fused columns of large coordinates and residue numbers
+        pdb_fp = os.path.join(self.tmpdir, 'fused.pdb')
+        with open(pdb_fp, 'w') as f:
+            f.write('ATOM      1  CA  GLY A1000    -100.123-200.456'
+                    '1000.000  1.00  0.00           C\n'
+                    'ATOM      2  CB  ALA A1001A     1.000   2.000'
+                    '   3.000  1.00  0.00           C\n'
+                    'HETATM    3  CB  ALA A1002      1.000   2.000'
+                    '   3.000  1.00  0.00           C\n'
+                    'ATOM      4  CA  ALA A1003      1.000   2.000'
+                    '   3.000  1.00  0.00           C\n')
+        resids, xyz = read_PDB_arrays(pdb_fp)
+        self.assertEqual(resids.tolist(), [1000, 1001])
+        self.assertEqual(xyz.tolist(), [[-100.123, -200.456, 1000.0],
+                                        [1.0, 2.0, 3.0]])
+        resids, xyz = read_PDB_arrays(pdb_fp, 'CA')
+        self.assertEqual(resids.tolist(), [1000, 1003])
+
+    def test_read_PDB_atoms(self):
+        # hydrogens of the NMR structure are skipped
+        pdb_fp = get_data_path('test_contacts/1dvd_exp_nmr.pdb')
+        resids, xyz, offsets = read_PDB_atoms(pdb_fp, chain='A')
+        self.assertEqual(offsets[:3].tolist(), [0, 8, 16])
+        self.assertEqual(resids[:2].tolist(), [1, 2])
+        self.assertEqual(xyz[7].tolist(), [-22.517, -11.671, 11.385])
+        self.assertEqual(offsets[-1], len(xyz))
+        self.assertEqual(len(offsets), len(resids) + 1)
+
+        resids, xyz, offsets = read_PDB_arrays(self.jbe_pdb, 'HA')
+        self.assertEqual(resids.tolist(),
+                         read_PDB_arrays(self.jbe_pdb)[0].tolist())
+        self.assertEqual(len(xyz), 967)
+
+        with self.assertRaises(ValueError):
+            read_PDB_coordinates(open(self.jbe_pdb, 'r'), 'HA')
+
+    def test_find_contacts_heavy_atoms(self):
+        coords = read_PDB_arrays(self.jbe_pdb, 'HA')
+        resids, xyz, offsets = coords
+        obs = list(find_PDB_contacts(coords))
+
+        # contacts as found by comparing all atoms of all residue pairs
+        exp = []
+        for a in range(len(resids)):
+            for b in range(a + 1, len(resids)):
+                diff = (xyz[offsets[a]:offsets[a + 1], None, :] -
+                        xyz[None, offsets[b]:offsets[b + 1], :])
+                dist = np.sqrt(np.sum(diff ** 2, axis=2)).min()
+                if dist <= 8 and resids[b] - resids[a] >= 5:
+                    exp.append((str(resids[a]), str(resids[b]), dist))
+        self.assertEqual([con[:2] for con in obs], [con[:2] for con in exp])
+        np.testing.assert_allclose([con[2] for con in obs],
+                                   [con[2] for con in exp])
+
+        # CB atoms are heavy atoms, hence each CB contact is a HA contact
+        obs = {con[:2]: con[2] for con in obs}
+        cb_coords = read_PDB_arrays(self.jbe_pdb)
+        for con in find_PDB_contacts(cb_coords):
+            self.assertLessEqual(obs[con[:2]], con[2])
+
+        # all heavy atom contacts of the structure itself are true contacts
+        cons = [[int(con[0]), int(con[1])] for con in obs]
+        self.assertEqual(contact_precision(coords, cons, [1.0] * len(cons)),
+                         1.0)
+        self.assertLess(contact_precision(cb_coords, cons,
+                                          [1.0] * len(cons)), 1.0)
+
+    def test_read_PDB_models(self):
+        pdb_fp = get_data_path('test_contacts/1dvd_exp_nmr.pdb')
+        models = read_PDB_models(pdb_fp)
+        self.assertEqual(list(models), ['A'])
+        resids, xyz = models['A']
+        self.assertEqual(xyz.shape, (17, 98, 3))
+        self.assertEqual(resids.tolist(), list(range(1, 99)))
+        # models are stacked, not mixed, the first model is read by default
+        self.assertEqual(xyz[0].tolist(), read_PDB_arrays(pdb_fp)[1].tolist())
+
+        pdb_fp = get_data_path('test_contacts/2vt4_exp.pdb')
+        models = read_PDB_models(pdb_fp)
+        self.assertEqual(list(models), ['A', 'B', 'C', 'D'])
+        for chain, (resids, xyz) in models.items():
+            exp = read_PDB_arrays(pdb_fp, chain=chain)
+            self.assertEqual(resids.tolist(), exp[0].tolist())
+            self.assertEqual(xyz.tolist(), [exp[1].tolist()])
+        self.assertEqual(list(read_PDB_models(pdb_fp, chain='C')), ['C'])
+
+        # models of different residues
+        lines = open(self.jbe_pdb, 'r').readlines()
+        atoms = [line for line in lines if line.startswith('ATOM')]
+        model = 'MODEL        %i\n%sENDMDL\n'
+        pdb_fh = io.StringIO(model % (1, ''.join(atoms)) +
+                             model % (2, ''.join(atoms[:-20])))
+        with self.assertRaises(ValueError):
+            read_PDB_models(pdb_fh)
+
+    def test_read_PDB_first_model(self):
+        pdb_fp = get_data_path('test_contacts/1dvd_exp_nmr.pdb')
+        model = open(pdb_fp, 'r').read().split('ENDMDL')[0]
+        for aacid in ['CB', 'HA']:
+            coords = read_PDB_arrays(pdb_fp, aacid)
+            exp = read_PDB_arrays(io.StringIO(model), aacid)
+            self.assertEqual(len(coords[0]), 98)
+            for obs_array, exp_array in zip(coords, exp):
+                self.assertEqual(obs_array.tolist(), exp_array.tolist())
+            self.assertEqual(list(find_PDB_contacts(coords)),
+                             list(find_PDB_contacts(exp)))
+        self.assertEqual(len(list(find_PDB_contacts(read_PDB_arrays(
+            pdb_fp)))), 237)
+
+    def test_ensemble(self):
+        pdb_fp = get_data_path('test_contacts/1dvd_exp_nmr.pdb')
+        models = read_PDB_models(pdb_fp)['A']
+        resids, xyz = models
+        cons = [[i, j] for i in range(1, 99, 3) for j in range(i, 99, 7)]
+
+        precisions, consensus = ensemble_precision(models, cons)
+        self.assertEqual(len(precisions), 17)
+        contacts = []
+        for model, precision in zip(xyz, precisions):
+            coords = (resids, model)
+            self.assertAlmostEqual(
+                contact_precision(coords, cons, [1.0] * len(cons)),
+                precision)
+            contacts.append({con[:2] for con in find_PDB_contacts(coords)})
+
+        obs = list(find_ensemble_contacts(models))
+        self.assertEqual({con[:2] for con in obs}, set.union(*contacts))
+        for con in obs:
+            self.assertAlmostEqual(
+                con[2], sum(con[:2] in model for model in contacts) / 17)
+        true_con = [[int(con[0]), int(con[1])] for con in obs
+                    if con[2] >= 0.5]
+        self.assertEqual(consensus, sum(con in true_con for con in cons
+                                        if con[1] - con[0] >= 5) /
+                         sum(con[1] - con[0] >= 5 for con in cons))
+
+        # a single model
+        self.assertEqual(
+            list(find_ensemble_contacts((resids, xyz[:1]))),
+            [con[:2] + (1.0,) for con in find_PDB_contacts((resids, xyz[0]))])
+
     def test_read_contacts(self):
         for inp_fp, real_con in zip([self.jbe_con, self.qjp_con],
                                     [self.real_n_con_jbe,
@@ -55,20 +247,103 @@ class ContactsTests(TestCase):
                 self.assertEqual(len(out_aa), real_con[contype])
             inp_fh.close()
 
+    def test_read_contacts_topX(self):
+        for contype in ['all', 'sr', 'lr']:
+            all_aa, all_ppv = read_contact_predictions(open(self.jbe_con, 'r'),
+                                                       contype=contype)
+            self.assertEqual(all_ppv, sorted(all_ppv, reverse=True))
+            for topX in [0, 1, 10, 126, len(all_ppv), 1e10]:
+                out_aa, out_ppv = read_contact_predictions(
+                    open(self.jbe_con, 'r'), topX=topX, contype=contype)
+                self.assertEqual(out_ppv, all_ppv[:int(topX)])
+                self.assertEqual(sorted(out_aa), sorted(all_aa[:int(topX)]))
+
+        inp_fh = io.StringIO('PFRMAT RR\n1 9 0 8 0.2\n2 20 0 8 0.9\n'
+                             '3 30 0 8 0.5\n')
+        self.assertEqual(read_contact_predictions(inp_fh, topX=2),
+                         ([[2, 20], [3, 30]], [0.9, 0.5]))
+        with self.assertRaises(ValueError):
+            read_contact_predictions(io.StringIO('1 9 0 8 0.2\n'))
+
     def test_find_contacts(self):
         for inp_fp in [self.jbe_pdb, self.qjp_pdb]:
-            inp_fh = open(inp_fp, 'r')
             for contype in ['all', 'lr']:
+                inp_fh = open(inp_fp, 'r')
                 con_file = re.sub('_clean.pdb', '.contacts_', inp_fp)+contype
-                for _c, _l in zip(find_PDB_contacts(
-                                     read_PDB_coordinates(inp_fh),
-                                     con_type=contype),
-                                  open(con_file).readlines()):
+                lines = open(con_file).readlines()
+                coords = read_PDB_coordinates(inp_fh)
+                inp_fh.close()
+                obs = list(find_PDB_contacts(coords, con_type=contype))
+                self.assertEqual(len(obs), len(lines))
+                for _c, _l in zip(obs, lines):
                     _i = _l.split()
                     self.assertEqual(_c[0], _i[0])
                     self.assertEqual(_c[1], _i[1])
                     self.assertEqual('%.4f' % _c[2], _i[2])
-            inp_fh.close()
+
+                # written output is identical to the reference file
+                out_fp = os.path.join(self.tmpdir, 'contacts')
+                list(find_PDB_contacts(coords, open(out_fp, 'w'),
+                                       con_type=contype))
+                with open(out_fp, 'r') as f:
+                    self.assertEqual(f.read(), ''.join(lines))
+
+        # contacts of neighbouring residues are excluded
+        coords = [[1, 0, 0, 0], [2, 0, 0, 3.8], [8, 0, 0, 7.6],
+                  [9, 0, 0, 20]]
+        self.assertEqual(list(find_PDB_contacts(coords)),
+                         [('1', '8', 7.6), ('2', '8', 3.8)])
+        self.assertEqual(list(find_PDB_contacts(coords[:1])), [])
+
+    def test_contact_map(self):
+        for aacid in ['CB', 'HA']:
+            coords = read_PDB_arrays(self.jbe_pdb, aacid)
+            resids, i, j, dist = contact_map(self.jbe_pdb, aacid)
+            self.assertEqual(resids.tolist(), coords[0].tolist())
+            # all sequence separations are held by the map
+            self.assertEqual(
+                [(str(resids[a]), str(resids[b]), d)
+                 for a, b, d in zip(i, j, dist) if resids[b] - resids[a] >= 5],
+                list(find_PDB_contacts(coords)))
+            self.assertEqual(len(list(find_PDB_contacts(coords, seq_sep=1))),
+                             len(i))
+
+        # sparse COO .npz files keep the given file name
+        out_fp = os.path.join(self.tmpdir, 'map')
+        write_contact_map(out_fp, resids, i, j, dist)
+        self.assertEqual(os.listdir(self.tmpdir), ['map'])
+        for exp, obs in zip((resids, i, j, dist), read_contact_map(out_fp)):
+            self.assertEqual(obs.tolist(), exp.tolist())
+
+    def test_contact_map_cache(self):
+        cache_dir = os.path.join(self.tmpdir, 'cache')
+        pdb_fp = os.path.join(self.tmpdir, '1jbeA.pdb')
+        shutil.copy(self.jbe_pdb, pdb_fp)
+
+        exp = contact_map(pdb_fp)
+        obs = contact_map(pdb_fp, cache_dir=cache_dir)
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+        for a, b in zip(obs, exp):
+            self.assertEqual(a.tolist(), b.tolist())
+
+        # repeated evaluations load the map
+        fp = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+        write_contact_map(fp, exp[0], exp[1][:3], exp[2][:3], exp[3][:3])
+        obs = contact_map(pdb_fp, cache_dir=cache_dir)
+        self.assertEqual(len(obs[1]), 3)
+
+        # atom type, cutoff and chain are part of the key
+        contact_map(pdb_fp, 'CA', cache_dir=cache_dir)
+        contact_map(pdb_fp, 'CB', 6, cache_dir=cache_dir)
+        contact_map(pdb_fp, chain='A', cache_dir=cache_dir)
+        self.assertEqual(len(os.listdir(cache_dir)), 4)
+
+        # a modified file is a different entry
+        stat = os.stat(pdb_fp)
+        os.utime(pdb_fp, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        obs = contact_map(pdb_fp, cache_dir=cache_dir)
+        self.assertEqual(len(obs[1]), len(exp[1]))
+        self.assertEqual(len(os.listdir(cache_dir)), 5)
 
     def test_contact_precision(self):
         for con_fp, pdb_fp in zip([self.jbe_con, self.qjp_con],
@@ -85,6 +360,195 @@ class ContactsTests(TestCase):
 
                 self.assertEqual(ref.split()[4], '%.4f' % out)
 
+    def test_contact_precision_annotation(self):
+        coords = read_PDB_coordinates(open(self.jbe_pdb, 'r'))
+        cons, ppvs = read_contact_predictions(open(self.jbe_con, 'r'),
+                                              topX=30)
+        exp = contact_precision(coords, cons, ppvs)
+
+        out_fp = os.path.join(self.tmpdir, 'annotated')
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            obs = contact_precision(coords, cons, ppvs, open(out_fp, 'w'),
+                                    verbose=True)
+        self.assertEqual(obs, exp)
+        with open(out_fp, 'r') as f:
+            lines = f.read()
+        self.assertEqual(lines, stdout.getvalue())
+
+        lines = [line.split('\t') for line in lines.splitlines()]
+        self.assertEqual(len(lines), 30)
+        self.assertEqual([[int(line[0]), int(line[1])] for line in lines],
+                         cons)
+        self.assertEqual(lines[0][2], '%.4f' % ppvs[0])
+        self.assertEqual(sum(line[3] == 'TRUE' for line in lines) / 30, exp)
+
+        # pairs closer in sequence than minsep are not evaluated
+        self.assertEqual(contact_precision(coords, [[10, 12], [10, 30]],
+                                           [0.9, 0.8], minsep=5),
+                         contact_precision(coords, [[10, 30]], [0.8]))
+
+    def test_contact_precision_residue_numbers(self):
+        # residue numbers start at 40 and have a gap after 238
+        pdb_fp = get_data_path('test_contacts/2vt4_exp.pdb')
+        resids, xyz = read_PDB_arrays(pdb_fp, chain='A')
+        rows = {resid: row for row, resid in enumerate(resids.tolist())}
+        cons = [[i, j] for i in range(30, 370, 9)
+                for j in range(i + 5, 370, 13)]
+        exp = {}
+        for i, j in cons:
+            if i in rows and j in rows:
+                dist = np.sqrt(np.sum((xyz[rows[i]] - xyz[rows[j]]) ** 2))
+                exp[(i, j)] = 'TRUE' if dist <= 8 else 'FALSE'
+            else:
+                exp[(i, j)] = 'MISSING'
+
+        out_fp = os.path.join(self.tmpdir, 'annotated')
+        obs = contact_precision((resids, xyz), cons, [1.0] * len(cons),
+                                open(out_fp, 'w'))
+        values = list(exp.values())
+        self.assertEqual(obs, values.count('TRUE') /
+                         (values.count('TRUE') + values.count('FALSE')))
+        with open(out_fp, 'r') as f:
+            lines = [line.split('\t') for line in f.read().splitlines()]
+        self.assertEqual({(int(line[0]), int(line[1])): line[3]
+                          for line in lines}, exp)
+        self.assertEqual(len(lines), len(cons))
+
+        # the same for heavy atoms and ensembles
+        # heavy atoms are at most as far apart as CB atoms
+        self.assertGreaterEqual(
+            contact_precision(read_PDB_arrays(pdb_fp, 'HA', 'A'), cons,
+                              [1.0] * len(cons)), obs)
+        precisions, _ = ensemble_precision(read_PDB_models(pdb_fp)['A'],
+                                           cons)
+        self.assertEqual(precisions.tolist(), [obs])
+
+    def test_contact_metrics(self):
+        coords = read_PDB_arrays(self.jbe_pdb)
+        resids, xyz = coords
+        diff = xyz[:, None, :] - xyz[None, :, :]
+        dist = np.sqrt(np.sum(diff ** 2, axis=2))
+        for contype, (con_min, con_max) in [('all', (5, 1000)),
+                                            ('sr', (5, 23)),
+                                            ('lr', (24, 1000))]:
+            pairs = [(a, b) for a in range(1, 127) for b in range(a, 127)
+                     if con_min <= b - a <= con_max]
+            true_pairs = {pair for pair in pairs
+                          if dist[pair[0] - 1, pair[1] - 1] <= 8}
+            for topL in [1, 2, 10]:
+                cons, ppvs = read_contact_predictions(
+                    open(self.jbe_con, 'r'), _topN_contacts(coords, topL),
+                    contype)
+                obs = contact_metrics(coords, cons, contype=contype)
+
+                pred = {tuple(con) for con in cons}
+                tp, fp = len(pred & true_pairs), len(pred - true_pairs)
+                fn = len(true_pairs - pred)
+                tn = len(pairs) - tp - fp - fn
+                self.assertEqual((obs['tp'], obs['fp'], obs['fn'], obs['tn']),
+                                 (tp, fp, fn, tn))
+                self.assertEqual(obs['precision'],
+                                 contact_precision(coords, cons, ppvs))
+                self.assertAlmostEqual(obs['recall'], tp / (tp + fn))
+                self.assertAlmostEqual(obs['f1'], 2 * tp / (2 * tp + fp + fn))
+                self.assertAlmostEqual(
+                    obs['mcc'], (tp * tn - fp * fn) /
+                    np.sqrt((tp + fp) * (tp + fn) * (tn + fp) * (tn + fn)))
+                if fp > 0:
+                    self.assertAlmostEqual(
+                        obs['fp_distance_error'],
+                        np.mean([dist[a - 1, b - 1] - 8
+                                 for a, b in pred - true_pairs]))
+                else:
+                    self.assertTrue(np.isnan(obs['fp_distance_error']))
+
+        # the true contacts may come from a (cached) contact map
+        self.assertEqual(contact_metrics(coords, cons,
+                                         con_map=contact_map(self.jbe_pdb)),
+                         contact_metrics(coords, cons))
+
+        # zero denominators
+        obs = contact_metrics(coords, [[1, 2], [500, 600]])
+        self.assertEqual((obs['tp'], obs['fp']), (0, 0))
+        self.assertTrue(np.isnan(obs['precision']))
+        self.assertTrue(np.isnan(obs['mcc']))
+        self.assertTrue(np.isnan(obs['fp_distance_error']))
+        self.assertEqual((obs['recall'], obs['f1']), (0.0, 0.0))
+        self.assertTrue(np.isnan(contact_precision(coords, [[500, 600]],
+                                                   [0.9])))
+
+    def test_precision_table(self):
+        for con_fp, pdb_fp in zip([self.jbe_con, self.qjp_con],
+                                  [self.jbe_pdb, self.qjp_pdb]):
+            ref_fp = re.sub('.psicov', '.precision', con_fp)
+            ref_lines = open(ref_fp, 'r').readlines()
+            coords = read_PDB_coordinates(open(pdb_fp, 'r'))
+            obs = precision_table(coords, open(con_fp, 'r'),
+                                  topLs=(1, 2, 5, 10),
+                                  contypes=('all', 'sr', 'mr', 'lr'))
+            self.assertEqual([row[:2] for row in obs],
+                             [(contype, topL)
+                              for contype in ['all', 'sr', 'mr', 'lr']
+                              for topL in [1, 2, 5, 10]])
+            obs = {row[:2]: row[2:] for row in obs}
+            for params, ref in zip(self.positive_params, ref_lines):
+                n, n_true, prec = obs[(params['-t'], params['-l'])]
+                self.assertEqual(ref.split()[4], '%.4f' % prec)
+                self.assertEqual(int(ref.split()[5]), n_true)
+                self.assertEqual(int(ref.split()[-1]), n)
+
+            # medium-range contacts as evaluated one at a time
+            for topL in [1, 2, 5, 10]:
+                cons, ppvs = read_contact_predictions(
+                    open(con_fp, 'r'), topX=_topN_contacts(coords, topL),
+                    contype='mr')
+                self.assertEqual(obs[('mr', topL)][2],
+                                 contact_precision(coords, cons, ppvs))
+
+    def test_batch_precision(self):
+        coords = read_PDB_coordinates(open(self.jbe_pdb, 'r'))
+        pred_dir = os.path.join(self.tmpdir, 'predictions')
+        os.mkdir(pred_dir)
+        for name in ['a.psicov', 'b.psicov']:
+            shutil.copy(self.jbe_con, os.path.join(pred_dir, name))
+        # the structure itself as a decoy, all its contacts are true
+        shutil.copy(self.jbe_pdb, os.path.join(pred_dir, 'decoy.pdb'))
+        # other files are skipped
+        ref_fp = re.sub('.psicov', '.precision', self.jbe_con)
+        shutil.copy(ref_fp, os.path.join(pred_dir, 'a.precision'))
+        with open(os.path.join(pred_dir, 'README'), 'w') as f:
+            f.write('predictions\n')
+        pred_fps = find_prediction_files(pred_dir)
+        self.assertEqual([os.path.basename(fp) for fp in pred_fps],
+                         ['a.psicov', 'b.psicov', 'decoy.pdb'])
+
+        manifest_fp = os.path.join(self.tmpdir, 'manifest')
+        with open(manifest_fp, 'w') as f:
+            f.write('# predictions\n%s\n\n' % '\n'.join(pred_fps[::-1]))
+        self.assertEqual(find_prediction_files(manifest_fp), pred_fps[::-1])
+
+        for params in self.positive_params:
+            topN = _topN_contacts(coords, params['-l'])
+            cons, ppvs = read_contact_predictions(open(self.jbe_con, 'r'),
+                                                  topX=topN,
+                                                  contype=params['-t'])
+            exp = contact_precision(coords, cons, ppvs)
+            for n_jobs in [1, 2]:
+                obs = batch_precision(coords, pred_fps, params['-l'],
+                                      params['-t'], n_jobs=n_jobs)
+                self.assertEqual([row[0] for row in obs], pred_fps)
+                self.assertEqual([row[3] for row in obs[:2]], [exp, exp])
+                self.assertEqual(obs[2][1], obs[2][2])
+                self.assertEqual(obs[2][3], 1.0)
+
+        out_fh = io.StringIO()
+        write_summary(batch_precision(coords, pred_fps[:1]), out_fh)
+        lines = out_fh.getvalue().splitlines()
+        self.assertEqual(lines[0], 'file\tn_contacts\tn_true\tprecision')
+        self.assertEqual(lines[1].split('\t')[0], pred_fps[0])
+        self.assertEqual(len(lines), 2)
+
 
 if __name__ == '__main__':
     main()
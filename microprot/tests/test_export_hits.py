@@ -0,0 +1,106 @@
+from unittest import TestCase, main
+import tempfile
+import shutil
+import os
+
+import numpy as np
+from skbio.util import get_data_path
+
+from microprot.scripts.split_search import parse_pdb_match
+from microprot.scripts.export_hits import (find_out_files, read_query_name,
+                                           hit_columns, export_hits)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.dir_data = os.path.dirname(
+            get_data_path('test_split_search/NC_000913.3_2.out'))
+        self.file_a = os.path.join(self.dir_data, 'T0831.out')
+        self.file_b = os.path.join(self.dir_data, 'poschaining_1.out')
+        self.tmpdir = tempfile.mkdtemp(prefix='exporthits_')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_find_out_files(self):
+        obs = find_out_files(self.dir_data)
+        self.assertIn(self.file_a, obs)
+        self.assertEqual(obs, sorted(obs))
+        self.assertTrue(all(fp.endswith('.out') for fp in obs))
+
+        os.makedirs(os.path.join(self.tmpdir, 'sub'))
+        for name in ['sub/a.out.gz', 'b.out', 'c.fasta']:
+            open(os.path.join(self.tmpdir, name), 'w').close()
+        self.assertEqual(find_out_files(self.tmpdir),
+                         [os.path.join(self.tmpdir, 'b.out'),
+                          os.path.join(self.tmpdir, 'sub/a.out.gz')])
+
+    def test_read_query_name(self):
+        self.assertEqual(read_query_name(self.file_a), 'T0831')
+
+    def test_hit_columns(self):
+        hits = parse_pdb_match(self.file_a)
+        obs = hit_columns(self.file_a)
+        self.assertEqual(len(obs['No']), len(hits))
+        self.assertEqual(set(obs['name']), {'T0831'})
+        self.assertEqual(set(obs['query']), {'T0831'})
+        self.assertEqual(obs['hit'][0], '4QN1_A')
+        self.assertEqual(obs['Probab'].tolist(),
+                         [hit['Probab'] for hit in hits])
+        self.assertEqual(obs['E_value'].tolist(),
+                         [hit['E-value'] for hit in hits])
+        self.assertEqual(obs['Aligned_cols'].tolist(),
+                         [hit['Aligned_cols'] for hit in hits])
+        self.assertEqual(obs['Template_Neff'].tolist(),
+                         [hit['Template_Neff'] for hit in hits])
+        self.assertEqual((obs['q_start'][0], obs['q_end'][0]), (1, 419))
+
+        # positions of hits without alignment lines from the summary table
+        obs = hit_columns(os.path.join(self.dir_data,
+                                       'GRAMNEG_T1D_3144_1-275.out'))
+        self.assertEqual(obs['No'][88], 89)
+        self.assertEqual((obs['q_start'][88], obs['q_end'][88]), (249, 249))
+        self.assertEqual((obs['t_start'][88], obs['t_end'][88]), (125, 125))
+        self.assertEqual(obs['q_start'][87], 1)
+
+    def test_export_hits(self):
+        filenames = [self.file_a, self.file_b]
+        exp = [hit_columns(fp) for fp in filenames]
+        for n_jobs in [1, 2]:
+            out_fp = os.path.join(self.tmpdir, 'hits%i.npz' % n_jobs)
+            export_hits(filenames, out_fp, n_jobs=n_jobs)
+            obs = np.load(out_fp)
+            n_a, n_b = len(exp[0]['No']), len(exp[1]['No'])
+            self.assertEqual(obs['row_groups'].tolist(),
+                             [0, n_a, n_a + n_b])
+            self.assertEqual(obs['sources'].tolist(), filenames)
+            for column in ['hit', 'Probab', 'P_value', 'Identities']:
+                self.assertEqual(obs[column].tolist(),
+                                 exp[0][column].tolist() +
+                                 exp[1][column].tolist())
+            # a query, such as hits with Prob > 90, is a column scan
+            self.assertEqual(int(np.sum(obs['Probab'] > 90)),
+                             sum(int(np.sum(e['Probab'] > 90)) for e in exp))
+
+        with self.assertRaises(ValueError):
+            export_hits(filenames, out_fp, fmt='csv')
+
+    def test_export_hits_parquet(self):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            with self.assertRaises(ImportError):
+                export_hits([self.file_b], os.path.join(self.tmpdir, 'p'),
+                            fmt='parquet')
+            return
+        out_fp = os.path.join(self.tmpdir, 'hits.parquet')
+        export_hits([self.file_a, self.file_b], out_fp, fmt='parquet')
+        meta = pq.ParquetFile(out_fp).metadata
+        self.assertEqual(meta.num_row_groups, 2)
+        self.assertEqual(meta.num_rows,
+                         len(hit_columns(self.file_a)['No']) +
+                         len(hit_columns(self.file_b)['No']))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,11 +2,17 @@ from unittest import TestCase, main
 
 from skbio.util import get_data_path
 
-from microprot.scripts.split_search import (is_overlapping,
+from microprot.scripts.split_search import (is_overlapping, _IntervalIndex,
                                             _parse_hit_summary_line,
+                                            _parse_hit_summary_fields,
                                             _parse_hit_block, parse_pdb_match,
+                                            iter_pdb_match, index_pdb_match,
+                                            read_hit_alignment,
+                                            select_pdb_match, Hit, hit_table,
+                                            filter_hits,
                                             select_hits, report_hits,
                                             report_uncovered_subsequences,
+                                            coverage_mask, uncovered_intervals,
                                             frag_size, get_q_id)
 
 
@@ -312,6 +318,34 @@ class ParsersTests(TestCase):
             str(ve.exception)
         )
 
+    def test__IntervalIndex(self):
+        index = _IntervalIndex([(150, 200), (20, 100)])
+        self.assertEqual(len(index), 2)
+        self.assertEqual(list(index), [(20, 100), (150, 200)])
+        self.assertTrue(index.overlaps(30, 150))
+        self.assertTrue(index.overlaps(2, 20))
+        self.assertTrue(index.overlaps(30, 70))
+        self.assertTrue(index.overlaps(5, 250))
+        self.assertTrue(index.overlaps(200, 210))
+        self.assertFalse(index.overlaps(101, 149))
+        self.assertFalse(index.overlaps(1, 8))
+        self.assertFalse(index.overlaps(201, 300))
+
+        index.add(110, 120)
+        self.assertEqual(list(index), [(20, 100), (110, 120), (150, 200)])
+        self.assertTrue(index.overlaps(101, 110))
+        self.assertFalse(index.overlaps(121, 149))
+        self.assertFalse(_IntervalIndex().overlaps(1, 8))
+
+        # overlaps up to a tolerance
+        self.assertFalse(index.overlaps(96, 112, tolerance=5))
+        self.assertTrue(index.overlaps(95, 112, tolerance=5))
+        self.assertTrue(index.overlaps(112, 118, tolerance=5))
+        self.assertTrue(index.overlaps(1, 300, tolerance=5))
+        index.add(96, 112)
+        self.assertFalse(index.overlaps(116, 150, tolerance=5))
+        self.assertTrue(index.overlaps(10, 25, tolerance=5))
+
     def test__parse_hit_summary_line(self):
         self.assertEqual(self.true_a, _parse_hit_summary_line(self.line_a))
         self.assertEqual(self.true_b, _parse_hit_summary_line(self.line_b))
@@ -320,10 +354,58 @@ class ParsersTests(TestCase):
         with self.assertRaises(ValueError):
             _parse_hit_summary_line('no valid line')
 
+        # fused Template HMM and length columns are handled by the fallback
+        line_e = ('  4 1abc_A Some protein; descripti  99.0 1.1E-10 3.1E-15   '
+                  '50.0   0.0  100  101-200 1001-1100(1500)\n')
+        true_e = {'No': 4,
+                  'Hit': '1abc_A Some protein; descripti',
+                  'Prob': 99.0,
+                  'E-value': 1.1E-10,
+                  'P-value': 3.1E-15,
+                  'Score': 50.0,
+                  'SS': 0.0,
+                  'Cols': 100,
+                  'Query HMM': '101-200',
+                  'Template HMM': '1001-1100',
+                  '#match states': 1500,
+                  }
+        self.assertEqual(true_e, _parse_hit_summary_line(line_e))
+
+        # description that does not fill its column
+        line_f = ('  2 1abc_A                          99.0 1.1E-10 3.1E-15   '
+                  '50.0   0.0  100  101-200     1-100 (150)\n')
+        obs = _parse_hit_summary_line(line_f)
+        self.assertEqual(obs['Hit'], '1abc_A')
+        self.assertEqual(obs['Prob'], 99.0)
+
+    def test__parse_hit_summary_fields(self):
+        for line in [self.line_a, self.line_b, self.line_c, self.line_d]:
+            self.assertEqual(_parse_hit_summary_fields(line),
+                             _parse_hit_summary_line(line))
+        with self.assertRaises(ValueError):
+            _parse_hit_summary_fields('no valid line')
+
     def test__parse_hit_block(self):
         self.assertEqual(self.true_block_a, _parse_hit_block(self.block_a))
         self.assertEqual(self.true_block_b, _parse_hit_block(self.block_b))
 
+        # stats line not following the expected layout
+        block = self.block_a.replace(
+            'Score=28.87  Aligned_cols=38', 'Aligned_cols=38  Score=28.87')
+        self.assertEqual(self.true_block_a, _parse_hit_block(block))
+
+        # raw bytes, as read from a binary file or memory map
+        self.assertEqual(self.true_block_b,
+                         _parse_hit_block(self.block_b.encode()))
+
+        # restrict alignment lines to the query
+        obs = _parse_hit_block(self.block_a, names=('Q ', ))
+        self.assertEqual(sorted(obs['alignment']),
+                         ['Q Consensus', 'Q T0810-D1'])
+        self.assertEqual(obs['alignment']['Q T0810-D1'],
+                         self.true_block_a['alignment']['Q T0810-D1'])
+        self.assertEqual(obs['Identities'], self.true_block_a['Identities'])
+
     def test_parse_pdb_match(self):
         res = parse_pdb_match(self.file_b)
         self.assertEqual(len(res), 10)
@@ -343,6 +425,167 @@ class ParsersTests(TestCase):
         with self.assertRaises(IOError):
             parse_pdb_match('/does/not/exist')
 
+    def test_iter_pdb_match(self):
+        hits = parse_pdb_match(self.file_a)
+        obs = iter_pdb_match(self.file_a)
+        self.assertEqual(next(obs), hits[0])
+        self.assertEqual(list(obs), hits[1:])
+
+        exp = [hit for hit in hits
+               if (hit['Probab'] >= 99.9) & (hit['E-value'] <= 1e-30)]
+        obs = list(iter_pdb_match(self.file_a, min_prob=99.9,
+                                  max_evalue=1e-30))
+        self.assertEqual(len(obs), 12)
+        self.assertEqual(obs, exp)
+
+        exp = [hit for hit in hits if hit['P-value'] <= 1e-40]
+        obs = list(iter_pdb_match(self.file_a, max_pvalue=1e-40))
+        self.assertEqual(obs, exp)
+
+        self.assertEqual(list(iter_pdb_match(self.file_a, min_prob=101)), [])
+
+        header = []
+        obs = iter_pdb_match(self.file_a, header=header)
+        self.assertEqual(next(obs), hits[0])
+        self.assertEqual(len(header), 8)
+        self.assertTrue(header[0].startswith('Query         gi|556503834|'))
+        self.assertTrue(header[5].startswith('Date '))
+
+        with self.assertRaises(IOError):
+            list(iter_pdb_match('/does/not/exist'))
+
+    def test_index_pdb_match(self):
+        hits = parse_pdb_match(self.file_b)
+        summaries, offsets = index_pdb_match(self.file_b)
+        self.assertEqual(len(summaries), 10)
+        self.assertEqual(sorted(offsets), list(range(1, 11)))
+        self.assertEqual(summaries[0]['Query HMM'], '71-108')
+
+        self.assertEqual(read_hit_alignment(self.file_b, offsets[1]),
+                         self.true_block_a)
+        self.assertEqual(read_hit_alignment(self.file_b, offsets[10]),
+                         self.true_block_b)
+        for summary, hit in zip(summaries, hits):
+            self.assertEqual(read_hit_alignment(self.file_b,
+                                                offsets[summary['No']],
+                                                summary), hit)
+
+        with self.assertRaises(IOError):
+            index_pdb_match('/does/not/exist')
+
+    def test_select_pdb_match(self):
+        hits = parse_pdb_match(self.file_a)
+        self.assertEqual(select_pdb_match(self.file_a),
+                         select_hits(hits, e_value_threshold=999999))
+
+        exp = select_hits([hit for hit in hits
+                           if (hit['Probab'] >= 95) &
+                              (frag_size(hit) >= 40) &
+                              (hit['Identities'] >= 0.33)],
+                          e_value_threshold=999999)
+        obs = select_pdb_match(self.file_a, min_prob=95,
+                               min_fragment_length=40, min_identity=0.33)
+        self.assertEqual([hit['No'] for hit in obs], [2, 5])
+        self.assertEqual(obs, exp)
+
+        self.assertEqual(select_pdb_match(self.file_a, max_evalue=1e-100), [])
+
+        obs = select_pdb_match(self.file_a, min_prob=95, names=('Q ', ))
+        exp = select_pdb_match(self.file_a, min_prob=95)
+        self.assertEqual([hit['alignment'] for hit in obs],
+                         [{name: line
+                           for name, line in hit['alignment'].items()
+                           if name.startswith('Q ')}
+                          for hit in exp])
+        self.assertTrue(all(len(hit['alignment']) == 2 for hit in obs))
+
+    def test_Hit(self):
+        obs = Hit.from_dict(self.hit)
+        self.assertEqual(obs.No, 225)
+        self.assertEqual(obs.description, self.hit['Hit'])
+        self.assertEqual(obs.Probab, 20.11)
+        self.assertEqual(obs.E_value, 41.0)
+        self.assertEqual(obs.P_value, 0.0011)
+        self.assertEqual(obs.Score, 28.65)
+        self.assertEqual(obs.Identities, 0.26)
+        self.assertEqual((obs.q_start, obs.q_end), (483, 525))
+        self.assertEqual((obs.t_start, obs.t_end), (35, 77))
+        self.assertEqual(obs.q_sequence,
+                         'QLKRQQSWLKNKHIDLRVCGVANSKALLTNVHGLNLENWQEEL')
+        self.assertEqual(obs.frag_size, frag_size(self.hit))
+        self.assertEqual(obs['E-value'], 41.0)
+        self.assertEqual(obs['Hit'], self.hit['Hit'])
+        self.assertEqual(obs, Hit.from_dict(self.hit))
+        with self.assertRaises(KeyError):
+            obs['alignment']
+        with self.assertRaises(AttributeError):
+            obs.foo = 1
+
+        # P-value is not part of an alignment block
+        obs = Hit.from_dict(self.true_block_a)
+        self.assertNotEqual(obs.P_value, obs.P_value)
+
+    def test_hit_table(self):
+        hits = parse_pdb_match(self.file_b)
+        obs = hit_table(hits)
+        self.assertEqual(obs.shape, (10, ))
+        self.assertEqual(list(obs['No']), list(range(1, 11)))
+        self.assertEqual(obs['E_value'][0], 18.0)
+        self.assertEqual(obs['Identities'][9], 0.13)
+        self.assertEqual((obs['q_start'][0], obs['q_end'][0]), (71, 108))
+        self.assertEqual((obs['t_start'][9], obs['t_end'][9]), (135, 217))
+        self.assertEqual(list(hit_table([Hit.from_dict(h) for h in hits])),
+                         list(obs))
+
+    def test_parse_as_hits(self):
+        for fp in [self.file_a, self.file_b]:
+            exp = [Hit.from_dict(hit) for hit in parse_pdb_match(fp)]
+            self.assertEqual(parse_pdb_match(fp, as_hits=True), exp)
+            self.assertEqual(list(iter_pdb_match(fp, as_hits=True)), exp)
+        exp = [Hit.from_dict(hit) for hit in parse_pdb_match(self.file_a)
+               if hit['Probab'] >= 95]
+        obs = list(iter_pdb_match(self.file_a, min_prob=95, as_hits=True))
+        self.assertEqual(obs, exp)
+
+    def test_hits_without_query_line(self):
+        # hits 89, 90 and 97 align a single column, without alignment lines
+        fp = get_data_path('test_split_search/GRAMNEG_T1D_3144_1-275.out')
+        dicts = parse_pdb_match(fp)
+        hits = parse_pdb_match(fp, as_hits=True)
+        self.assertEqual(hits, [Hit.from_dict(hit) for hit in dicts])
+        self.assertEqual(dicts[88]['alignment'], {})
+        self.assertEqual(frag_size(dicts[88]), 1)
+        self.assertEqual((hits[88].q_start, hits[88].q_end), (249, 249))
+        self.assertEqual((hits[88].t_start, hits[88].t_end), (125, 125))
+        self.assertIsNone(hits[88].q_sequence)
+        self.assertEqual((hits[87].q_start, hits[87].q_end), (1, 18))
+        self.assertNotIn('Query HMM', dicts[87])
+
+        obs = filter_hits(dicts, max_evalue=0.5)
+        self.assertEqual([hit['No'] for hit in obs],
+                         [hit['No'] for hit in dicts if hit['E-value'] <= 0.5])
+        self.assertEqual([hit['No'] for hit in filter_hits(dicts)],
+                         list(range(1, len(dicts) + 1)))
+
+    def test_filter_hits(self):
+        dicts = parse_pdb_match(self.file_a)
+        hits = [Hit.from_dict(hit) for hit in dicts]
+        exp = [Hit.from_dict(hit) for hit in dicts
+               if (hit['Probab'] >= 95) & (hit['E-value'] <= 1e-20) &
+               (hit['P-value'] <= 1e-30) & (frag_size(hit) >= 300) &
+               (hit['Identities'] >= 0.3)]
+        obs = filter_hits(hits, min_prob=95, max_evalue=1e-20,
+                          max_pvalue=1e-30, min_fragment_length=300,
+                          min_identity=0.3)
+        self.assertEqual(len(obs), 5)
+        self.assertEqual(obs, exp)
+        self.assertEqual(filter_hits(hits), hits)
+        self.assertEqual(filter_hits([]), [])
+
+        # selection works on Hit objects as well
+        self.assertEqual([hit.No for hit in select_hits(hits)],
+                         [hit['No'] for hit in select_hits(dicts)])
+
     def test_select_hits(self):
         hits = parse_pdb_match(self.file_b)
         self.assertEqual(len(select_hits(hits, e_value_threshold=100)), 2)
@@ -354,6 +597,23 @@ class ParsersTests(TestCase):
         self.assertEqual(goodhits[0]['No'], 1)
         self.assertEqual(goodhits[1]['No'], 5)
 
+        # selected hits share at most max_overlap query positions
+        for max_overlap in [0, 5, 20]:
+            goodhits = select_hits(hits, e_value_threshold=999999,
+                                   max_overlap=max_overlap)
+            ranges = [(hit['alignment'][get_q_id(hit)]['start'],
+                       hit['alignment'][get_q_id(hit)]['end'])
+                      for hit in goodhits]
+            for i, a in enumerate(ranges):
+                for b in ranges[:i]:
+                    self.assertLessEqual(min(a[1], b[1]) - max(a[0], b[0]) + 1,
+                                         max_overlap)
+            self.assertEqual(select_pdb_match(self.file_a,
+                                              max_overlap=max_overlap),
+                             goodhits)
+        self.assertGreater(len(select_hits(hits, 999999, max_overlap=20)),
+                           len(select_hits(hits, 999999)))
+
     def test_report_hits(self):
         hits = select_hits(parse_pdb_match(self.file_a))
         rep = report_hits(hits)
@@ -364,6 +624,36 @@ class ParsersTests(TestCase):
         subseqs = report_uncovered_subsequences(hits, self.query, 0)
         self.assertEqual(subseqs, self.true_subseqs)
 
+        # touching and overlapping hits
+        hits = [{'alignment': {'Q x': {'start': start, 'end': end}}}
+                for start, end in [(20, 40), (41, 50), (45, 60), (70, 80)]]
+        self.assertEqual(report_uncovered_subsequences(hits, 'A' * 100, 0),
+                         [{'sequence': 'A' * 19, 'start': 1, 'end': 19},
+                          {'sequence': 'A' * 9, 'start': 61, 'end': 69},
+                          {'sequence': 'A' * 20, 'start': 81, 'end': 100}])
+        self.assertEqual(report_uncovered_subsequences(hits, 'A' * 100, 0,
+                                                       min_gap=10),
+                         [{'sequence': 'A' * 19, 'start': 1, 'end': 19},
+                          {'sequence': 'A' * 20, 'start': 81, 'end': 100}])
+        self.assertEqual(report_uncovered_subsequences(hits, 'A' * 100, 20),
+                         [{'sequence': 'A' * 20, 'start': 81, 'end': 100}])
+
+    def test_coverage_mask(self):
+        obs = coverage_mask([(2, 4), (4, 5), (9, 12), (0, 1)], 10)
+        self.assertEqual(obs.tolist(), [1, 1, 1, 2, 1, 0, 0, 0, 1, 1])
+        self.assertEqual(coverage_mask([], 3).tolist(), [0, 0, 0])
+
+    def test_uncovered_intervals(self):
+        intervals = [(5, 10), (11, 20), (15, 30), (33, 40), (46, 50)]
+        self.assertEqual(uncovered_intervals(intervals, 60),
+                         [(1, 4), (31, 32), (41, 45), (51, 60)])
+        self.assertEqual(uncovered_intervals(intervals, 60, min_gap=5),
+                         [(1, 4), (41, 45), (51, 60)])
+        self.assertEqual(uncovered_intervals(intervals, 50, min_gap=50),
+                         [(1, 4)])
+        self.assertEqual(uncovered_intervals([], 5), [(1, 5)])
+        self.assertEqual(uncovered_intervals([(1, 5)], 5), [])
+
     def test_frag_size(self):
         obs = frag_size(self.minhit)
         self.assertEqual(obs, 30)
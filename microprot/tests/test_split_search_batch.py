@@ -0,0 +1,99 @@
+from unittest import TestCase, main
+import tempfile
+import shutil
+import os
+
+from click.testing import CliRunner
+from skbio.util import get_data_path
+
+from microprot.scripts.split_search import (mask_sequence, mask_sequences,
+                                            find_search_pairs, _split_search)
+
+
+class BatchTests(TestCase):
+    def setUp(self):
+        self.dir_data = os.path.dirname(
+            get_data_path('test_split_search/NC_000913.3_2.out'))
+        self.names = ['GRAMNEG_T1D_3144_1-275',
+                      'GRAMNEG_T1D_5168',
+                      'NC_000913.3_2',
+                      'NZ_GG666849.1_2_251-330',
+                      'poschaining_1',
+                      'poschaining_2']
+        self.pairs = [(os.path.join(self.dir_data, '%s.out' % name),
+                       os.path.join(self.dir_data, '%s.fasta' % name))
+                      for name in self.names]
+        self.tmpdir = tempfile.mkdtemp(prefix='splitbatch_')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_find_search_pairs(self):
+        self.assertEqual(find_search_pairs(self.dir_data), self.pairs)
+
+        manifest = os.path.join(self.tmpdir, 'manifest.txt')
+        with open(manifest, 'w') as f:
+            f.write('# out\tfasta\n\n')
+            for pair in self.pairs[::-1]:
+                f.write('%s\t%s\n' % pair)
+        self.assertEqual(find_search_pairs(manifest), self.pairs[::-1])
+
+        with open(manifest, 'a') as f:
+            f.write('only_one_file.out\n')
+        with self.assertRaises(ValueError):
+            find_search_pairs(manifest)
+
+    def test_mask_sequences(self):
+        exp = [mask_sequence(hh_fp, fasta_fp, min_prob=95.0,
+                             min_fragment_length=40)
+               for hh_fp, fasta_fp in self.pairs]
+
+        obs = mask_sequences(self.pairs, min_prob=95.0,
+                             min_fragment_length=40)
+        self.assertEqual(obs, exp)
+
+        outdir = os.path.join(self.tmpdir, 'out')
+        obs = mask_sequences(self.pairs, outdir=outdir, n_jobs=2,
+                             min_prob=95.0, min_fragment_length=40)
+        self.assertEqual(obs, exp)
+        for name, res in zip(self.names, exp):
+            for type_ in ('match', 'non_match'):
+                with open(os.path.join(outdir, '%s.%s' % (name, type_))) as f:
+                    self.assertEqual(f.read(), ''.join(
+                        ['>%s\n%s\n' % r for r in res[type_]]))
+
+        self.assertEqual(mask_sequences([], n_jobs=2), [])
+
+    def test_mask_sequences_blasttab(self):
+        pairs = find_search_pairs(self.dir_data, extension='.m8')
+        name = os.path.join(self.dir_data, 'NC_000913.3_2')
+        self.assertEqual(pairs, [(name + '.m8', name + '.fasta')])
+        exp = [mask_sequence(name + '.m8', name + '.fasta', max_evalue=1e-3,
+                             blasttab=True)]
+        self.assertEqual(mask_sequences(pairs, max_evalue=1e-3,
+                                        blasttab=True), exp)
+
+        outdir = os.path.join(self.tmpdir, 'out')
+        res = CliRunner().invoke(_split_search, [
+            '--batch', self.dir_data, '--blasttab', '-e', '1e-3',
+            '-o', outdir])
+        self.assertEqual(res.exit_code, 0)
+        self.assertEqual(sorted(os.listdir(outdir)),
+                         ['NC_000913.3_2.match', 'NC_000913.3_2.non_match'])
+        with open(os.path.join(outdir, 'NC_000913.3_2.match')) as f:
+            self.assertEqual(f.read(), ''.join(
+                ['>%s\n%s\n' % r for r in exp[0]['match']]))
+
+    def test_split_search_options(self):
+        name = os.path.join(self.dir_data, 'NC_000913.3_2')
+        for params in [['--ffindex', name, name, '--blasttab'],
+                       ['--ffindex', name, name, '--cache_dir', self.tmpdir],
+                       ['--batch', self.dir_data, '--percent_identity'],
+                       ['--percent_identity', name + '.m8',
+                        name + '.fasta']]:
+            res = CliRunner().invoke(_split_search, params)
+            self.assertEqual(res.exit_code, 2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+from unittest import TestCase, main
+import tempfile
+import shutil
+import os
+
+import numpy as np
+from skbio.util import get_data_path
+
+from microprot.scripts.split_search import (mask_sequence, parse_blasttab,
+                                            parse_pdb_match, Hit)
+
+
+class BlasttabTests(TestCase):
+    def setUp(self):
+        self.file_out = get_data_path('test_split_search/NC_000913.3_2.out')
+        self.file_tab = get_data_path('test_split_search/NC_000913.3_2.m8')
+        self.file_fasta = get_data_path(
+            'test_split_search/NC_000913.3_2.fasta')
+        self.tmpdir = tempfile.mkdtemp(prefix='splitblasttab_')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_parse_blasttab(self):
+        exp = parse_pdb_match(self.file_out)
+        obs = parse_blasttab(self.file_tab)
+        self.assertEqual(len(obs), len(exp))
+        self.assertEqual(obs[0]['Hit'], '2j0w_A')
+        self.assertEqual(obs[0]['Identities'], 0.31)
+        self.assertEqual(obs[0]['Aligned_cols'], 442)
+        self.assertTrue(np.isnan(obs[0]['Probab']))
+        for o, e in zip(obs, exp):
+            o, e = Hit.from_dict(o), Hit.from_dict(e)
+            self.assertEqual((o.No, o.q_start, o.q_end, o.t_start, o.t_end),
+                             (e.No, e.q_start, e.q_end, e.t_start, e.t_end))
+            self.assertAlmostEqual(o.E_value / e.E_value, 1, places=1)
+
+        # BLAST reports identities as percentages
+        tab_fp = os.path.join(self.tmpdir, 'blast.m8')
+        with open(tab_fp, 'w') as f:
+            f.write('# comment\nq1\tt1\t45.5\t10\t5\t0\t1\t10\t3\t12'
+                    '\t1e-5\t50.1\n\n')
+        obs = parse_blasttab(tab_fp, percent_identity=True)
+        self.assertEqual(len(obs), 1)
+        self.assertEqual(obs[0]['Identities'], 0.455)
+        self.assertEqual(obs[0]['alignment'],
+                         {'Q q1': {'start': 1, 'end': 10},
+                          'T t1': {'start': 3, 'end': 12}})
+
+        # the unit is never guessed from the values
+        with open(tab_fp, 'w') as f:
+            f.write('q1\tt1\t0.5\t10\t5\t0\t1\t10\t3\t12\t1e-5\t50.1\n')
+        self.assertEqual(parse_blasttab(tab_fp)[0]['Identities'], 0.5)
+        self.assertEqual(parse_blasttab(tab_fp, percent_identity=True)[0]
+                         ['Identities'], 0.005)
+
+        with open(tab_fp, 'a') as f:
+            f.write('q1\tt1\t45.5\t10\n')
+        with self.assertRaises(ValueError):
+            parse_blasttab(tab_fp)
+
+    def test_mask_sequence(self):
+        for kwargs in [{'max_evalue': 1e-3},
+                       {'max_evalue': 1, 'min_fragment_length': 40},
+                       {'min_identity': 0.3, 'min_fragment_length': 10}]:
+            exp = mask_sequence(self.file_out, self.file_fasta, **kwargs)
+            obs = mask_sequence(self.file_tab, self.file_fasta,
+                                blasttab=True, **kwargs)
+            self.assertEqual(obs, exp)
+
+        with self.assertRaises(ValueError):
+            mask_sequence(self.file_tab, self.file_fasta, blasttab=True,
+                          min_prob=90)
+        with self.assertRaises(ValueError):
+            mask_sequence(self.file_tab, self.file_fasta, blasttab=True,
+                          max_pvalue=0.01)
+
+
+if __name__ == '__main__':
+    main()
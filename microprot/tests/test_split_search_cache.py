@@ -0,0 +1,118 @@
+from unittest import TestCase, main
+import tempfile
+import shutil
+import os
+from unittest import mock
+
+from skbio.util import get_data_path
+
+from microprot.scripts import split_search
+from microprot.scripts.split_search import (mask_sequence, parse_pdb_match,
+                                            _cache_key, _load_cached_hits)
+
+
+class CacheTests(TestCase):
+    def setUp(self):
+        self.file_a = get_data_path('test_split_search/NC_000913.3_2.out')
+        self.fasta_a = get_data_path('test_split_search/NC_000913.3_2.fasta')
+        self.file_b = get_data_path('test_split_search/T0810-D1.fasta.out')
+        self.tmpdir = tempfile.mkdtemp(prefix='splitcache_')
+        self.cache_dir = os.path.join(self.tmpdir, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_parse_pdb_match_cache(self):
+        exp = parse_pdb_match(self.file_a)
+        obs = parse_pdb_match(self.file_a, cache_dir=self.cache_dir)
+        self.assertEqual(obs, exp)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        key = _cache_key(self.file_a)
+        self.assertEqual(_load_cached_hits(self.cache_dir, key), exp)
+        self.assertEqual(parse_pdb_match(self.file_a,
+                                         cache_dir=self.cache_dir), exp)
+        self.assertIsNone(_load_cached_hits(self.cache_dir, 'missing'))
+
+    def test_cache_key(self):
+        copy_fp = os.path.join(self.tmpdir, 'copy.out')
+        shutil.copyfile(self.file_a, copy_fp)
+        self.assertNotEqual(_cache_key(self.file_a), _cache_key(copy_fp))
+        self.assertEqual(_cache_key(self.file_a, hash_content=True),
+                         _cache_key(copy_fp, hash_content=True))
+        self.assertNotEqual(_cache_key(self.file_a, hash_content=True),
+                            _cache_key(self.file_b, hash_content=True))
+
+        key = _cache_key(copy_fp)
+        os.utime(copy_fp, ns=(0, 0))
+        self.assertNotEqual(_cache_key(copy_fp), key)
+
+        with self.assertRaises(IOError):
+            _cache_key('/does/not/exist')
+
+    def test_cache_eviction(self):
+        parse_pdb_match(self.file_a, cache_dir=self.cache_dir)
+        parse_pdb_match(self.file_b, cache_dir=self.cache_dir,
+                        cache_max_bytes=1)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+        parse_pdb_match(self.file_a, cache_dir=self.cache_dir)
+        entry_a = os.path.join(self.cache_dir,
+                               '%s.pkl' % _cache_key(self.file_a))
+        size_a = os.path.getsize(entry_a)
+        os.utime(entry_a, ns=(0, 0))
+        # least recently used entry is evicted first
+        parse_pdb_match(self.file_b, cache_dir=self.cache_dir,
+                        cache_max_bytes=size_a)
+        self.assertEqual(os.listdir(self.cache_dir),
+                         ['%s.pkl' % _cache_key(self.file_b)])
+
+    def test_cache_eviction_scans(self):
+        fps = []
+        for i in range(10):
+            fps.append(os.path.join(self.tmpdir, '%i.out' % i))
+            shutil.copyfile(self.file_a, fps[-1])
+
+        # the cache directory is scanned once, not on every store
+        with mock.patch.object(split_search, '_evict_cache',
+                               wraps=split_search._evict_cache) as evict:
+            for fp in fps:
+                parse_pdb_match(fp, cache_dir=self.cache_dir)
+            self.assertEqual(evict.call_count, 1)
+            self.assertEqual(len(os.listdir(self.cache_dir)), 10)
+
+            # and again, once the estimated size exceeds the bound
+            size = os.path.getsize(os.path.join(
+                self.cache_dir, os.listdir(self.cache_dir)[0]))
+            parse_pdb_match(self.file_b, cache_dir=self.cache_dir,
+                            cache_max_bytes=5 * size)
+            self.assertEqual(evict.call_count, 2)
+        self.assertLessEqual(len(os.listdir(self.cache_dir)), 5)
+
+    def test_mask_sequence_cache(self):
+        for params in [{}, {'min_prob': 95.0, 'min_fragment_length': 40},
+                       {'max_evalue': 1e-50, 'min_identity': 0.33},
+                       {'max_pvalue': 1e-40}]:
+            exp = mask_sequence(self.file_a, self.fasta_a, **params)
+            obs = mask_sequence(self.file_a, self.fasta_a,
+                                cache_dir=self.cache_dir, **params)
+            self.assertEqual(obs, exp)
+
+    def test_mask_sequence_cache_no_query_line(self):
+        # hits 89, 90 and 97 align a single column, without alignment lines
+        file_out = get_data_path(
+            'test_split_search/GRAMNEG_T1D_3144_1-275.out')
+        file_fasta = get_data_path(
+            'test_split_search/GRAMNEG_T1D_3144_1-275.fasta')
+        for params in [{}, {'max_evalue': 0.5}, {'max_overlap': 300}]:
+            exp = mask_sequence(file_out, file_fasta, **params)
+            obs = mask_sequence(file_out, file_fasta,
+                                cache_dir=self.cache_dir, **params)
+            self.assertEqual(obs, exp)
+        self.assertEqual([seq for header, seq in exp['match']
+                          if header.startswith('GRAMNEG_T1D_3144_249-249 ')],
+                         ['Q'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+from unittest import TestCase, main
+import tempfile
+import tarfile
+import shutil
+import gzip
+import bz2
+import lzma
+import os
+
+from skbio.util import get_data_path
+
+from microprot.scripts.split_search import (mask_sequence, parse_pdb_match,
+                                            index_pdb_match, select_pdb_match,
+                                            read_hit_alignment,
+                                            _split_tar_path, _cache_key)
+
+
+class CompressedTests(TestCase):
+    def setUp(self):
+        self.file_a = get_data_path('test_split_search/NC_000913.3_2.out')
+        self.fasta_a = get_data_path('test_split_search/NC_000913.3_2.fasta')
+        self.tmpdir = tempfile.mkdtemp(prefix='splitcompressed_')
+
+        with open(self.file_a, 'rb') as f:
+            content = f.read()
+        self.compressed = []
+        for ext, opener in [('gz', gzip.open), ('bz2', bz2.open),
+                            ('xz', lzma.open)]:
+            fp = os.path.join(self.tmpdir, 'NC_000913.3_2.out.%s' % ext)
+            with opener(fp, 'wb') as f:
+                f.write(content)
+            self.compressed.append(fp)
+
+        # packaged like the outputs of a sequence in pkg/
+        self.tarball = os.path.join(self.tmpdir, 'NC_000913.3_2.tar.gz')
+        with tarfile.open(self.tarball, 'w:gz') as tar:
+            tar.add(self.fasta_a, arcname='00-seq/NC_000913.3_2.fasta')
+            tar.add(self.file_a, arcname='01-PDB/NC_000913.3_2.out')
+        self.member = os.path.join(self.tarball, '01-PDB/NC_000913.3_2.out')
+        self.member_fasta = os.path.join(self.tarball,
+                                         '00-seq/NC_000913.3_2.fasta')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test__split_tar_path(self):
+        self.assertEqual(_split_tar_path(self.file_a), (self.file_a, None))
+        self.assertEqual(_split_tar_path(self.member),
+                         (self.tarball, '01-PDB/NC_000913.3_2.out'))
+        self.assertEqual(_split_tar_path('/does/not/exist'),
+                         ('/does/not/exist', None))
+
+    def test_parse_pdb_match(self):
+        exp = parse_pdb_match(self.file_a)
+        for fp in self.compressed + [self.member]:
+            self.assertEqual(parse_pdb_match(fp), exp)
+
+        with self.assertRaises(IOError):
+            parse_pdb_match(os.path.join(self.tarball, '01-PDB/missing.out'))
+
+    def test_index_pdb_match(self):
+        exp_summaries, exp_offsets = index_pdb_match(self.file_a)
+        for fp in self.compressed + [self.member]:
+            summaries, offsets = index_pdb_match(fp)
+            self.assertEqual(summaries, exp_summaries)
+            self.assertEqual(offsets, exp_offsets)
+            self.assertEqual(read_hit_alignment(fp, offsets[3]),
+                             read_hit_alignment(self.file_a, offsets[3]))
+
+    def test_select_pdb_match(self):
+        exp = select_pdb_match(self.file_a, min_prob=95)
+        for fp in self.compressed + [self.member]:
+            self.assertEqual(select_pdb_match(fp, min_prob=95), exp)
+
+    def test_mask_sequence(self):
+        exp = mask_sequence(self.file_a, self.fasta_a, min_prob=95)
+        for fp in self.compressed:
+            self.assertEqual(mask_sequence(fp, self.fasta_a, min_prob=95),
+                             exp)
+        self.assertEqual(mask_sequence(self.member, self.member_fasta,
+                                       min_prob=95), exp)
+
+        cache_dir = os.path.join(self.tmpdir, 'cache')
+        self.assertEqual(mask_sequence(self.member, self.fasta_a,
+                                       min_prob=95, cache_dir=cache_dir),
+                         exp)
+
+    def test_cache_key(self):
+        self.assertEqual(_cache_key(self.compressed[0], hash_content=True),
+                         _cache_key(self.file_a, hash_content=True))
+        self.assertNotEqual(_cache_key(self.member), _cache_key(self.tarball))
+
+
+if __name__ == '__main__':
+    main()
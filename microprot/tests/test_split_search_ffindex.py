@@ -0,0 +1,101 @@
+from unittest import TestCase, main
+import tempfile
+import shutil
+import os
+
+from skbio.util import get_data_path
+
+from microprot.scripts.split_search import (mask_sequence, mask_ffindex,
+                                            read_ffindex, FFindexDB,
+                                            _ffindex_fps)
+
+
+def _write_ffindex(prefix, entries):
+    """ Writes an ffindex database from a list of (name, filepath). """
+    data_fp, index_fp = _ffindex_fps(prefix)
+    offset = 0
+    with open(data_fp, 'wb') as data, open(index_fp, 'w') as index:
+        for name, fp in sorted(entries):
+            with open(fp, 'rb') as f:
+                content = f.read() + b'\0'
+            data.write(content)
+            index.write('%s\t%i\t%i\n' % (name, offset, len(content)))
+            offset += len(content)
+
+
+class FFindexTests(TestCase):
+    def setUp(self):
+        self.dir_data = os.path.dirname(
+            get_data_path('test_split_search/NC_000913.3_2.out'))
+        self.names = ['GRAMNEG_T1D_3144_1-275',
+                      'GRAMNEG_T1D_5168',
+                      'NC_000913.3_2',
+                      'NZ_GG666849.1_2_251-330',
+                      'poschaining_1',
+                      'poschaining_2']
+        self.tmpdir = tempfile.mkdtemp(prefix='splitffindex_')
+        self.result_db = os.path.join(self.tmpdir, 'hhsearch')
+        self.sequence_db = os.path.join(self.tmpdir, 'queries')
+        _write_ffindex(self.result_db, [
+            (name, os.path.join(self.dir_data, '%s.out' % name))
+            for name in self.names])
+        _write_ffindex(self.sequence_db, [
+            (name, os.path.join(self.dir_data, '%s.fasta' % name))
+            for name in self.names])
+        self.kwargs = {'min_prob': 90, 'min_fragment_length': 30}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test__ffindex_fps(self):
+        exp = ('db.ffdata', 'db.ffindex')
+        self.assertEqual(_ffindex_fps('db'), exp)
+        self.assertEqual(_ffindex_fps('db.ffdata'), exp)
+        self.assertEqual(_ffindex_fps('db.ffindex'), exp)
+
+    def test_read_ffindex(self):
+        index = read_ffindex(self.result_db + '.ffindex')
+        self.assertEqual(list(index), self.names)
+        self.assertEqual(index[self.names[0]][0], 0)
+
+        with open(self.result_db + '.ffindex', 'a') as f:
+            f.write('broken\t0\n')
+        with self.assertRaises(ValueError):
+            read_ffindex(self.result_db + '.ffindex')
+        with self.assertRaises(IOError):
+            read_ffindex('/does/not/exist.ffindex')
+
+    def test_FFindexDB(self):
+        with FFindexDB(self.result_db) as db:
+            self.assertEqual(len(db), 6)
+            self.assertEqual(list(db), self.names)
+            self.assertTrue('NC_000913.3_2' in db)
+            self.assertFalse('missing' in db)
+            with open(os.path.join(self.dir_data,
+                                   'poschaining_1.out'), 'rb') as f:
+                self.assertEqual(db['poschaining_1'], f.read())
+            with self.assertRaises(KeyError):
+                db['missing']
+
+    def test_mask_ffindex(self):
+        exp = [mask_sequence(os.path.join(self.dir_data, '%s.out' % name),
+                             os.path.join(self.dir_data, '%s.fasta' % name),
+                             **self.kwargs)
+               for name in self.names]
+        for n_jobs in [1, 2]:
+            obs = mask_ffindex(self.result_db, self.sequence_db,
+                               n_jobs=n_jobs, **self.kwargs)
+            self.assertEqual(list(obs), self.names)
+            self.assertEqual(list(obs.values()), exp)
+
+        out_fp = os.path.join(self.tmpdir, 'all')
+        mask_ffindex(self.result_db, self.sequence_db, out_fp, **self.kwargs)
+        for type_ in ['match', 'non_match']:
+            with open('%s.%s' % (out_fp, type_), 'r') as f:
+                self.assertEqual(f.read(), ''.join(
+                    '>%s\n%s\n' % subseq
+                    for res in exp for subseq in res[type_]))
+
+
+if __name__ == '__main__':
+    main()
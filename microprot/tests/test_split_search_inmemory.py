@@ -0,0 +1,89 @@
+from unittest import TestCase, main
+import tempfile
+import shutil
+import os
+
+from skbio import Protein
+from skbio.util import get_data_path
+
+from microprot.scripts.split_search import (mask_sequence, mask_hits,
+                                            parse_pdb_match)
+from microprot.scripts.process_fasta import split_fasta
+
+
+class InMemoryTests(TestCase):
+    def setUp(self):
+        self.file_out = get_data_path('test_split_search/poschaining_1.out')
+        self.file_fasta = get_data_path(
+            'test_split_search/poschaining_1.fasta')
+        self.hits = parse_pdb_match(self.file_out)
+        self.query = Protein.read(self.file_fasta, seq_num=1)
+        self.kwargs = {'max_pvalue': 0.95, 'min_fragment_length': 10}
+        self.tmpdir = tempfile.mkdtemp(prefix='splitinmemory_')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def assertFragments(self, obs, exp):
+        self.assertEqual(sorted(obs), sorted(exp))
+        for type_ in exp:
+            self.assertEqual([('%s %s' % (frag.metadata['id'],
+                                          frag.metadata['description']),
+                               str(frag)) for frag in obs[type_]],
+                             exp[type_])
+
+    def test_mask_hits(self):
+        exp = mask_sequence(self.file_out, self.file_fasta, **self.kwargs)
+
+        obs = mask_hits(self.hits, self.query, **self.kwargs)
+        self.assertFragments(obs, exp)
+        self.assertEqual([(frag.metadata['start'], frag.metadata['end'])
+                          for frag in obs['match']],
+                         [(223, 250), (331, 380)])
+
+        header = '%s %s' % (self.query.metadata['id'],
+                            self.query.metadata['description'])
+        obs = mask_hits(self.hits, str(self.query), header='>%s' % header,
+                        **self.kwargs)
+        self.assertFragments(obs, exp)
+
+    def test_mask_hits_no_query_line(self):
+        # hits 89, 90 and 97 align a single column, without alignment lines
+        file_out = get_data_path(
+            'test_split_search/GRAMNEG_T1D_3144_1-275.out')
+        file_fasta = get_data_path(
+            'test_split_search/GRAMNEG_T1D_3144_1-275.fasta')
+        hits = parse_pdb_match(file_out)
+        query = Protein.read(file_fasta, seq_num=1)
+        for kwargs in [{}, {'max_evalue': 0.5}, {'max_overlap': 300}]:
+            exp = mask_sequence(file_out, file_fasta, **kwargs)
+            obs = mask_hits(hits, query, **kwargs)
+            # the query has no description, compare identifiers only
+            for type_ in exp:
+                self.assertEqual([(frag.metadata['id'], str(frag))
+                                  for frag in obs[type_]],
+                                 [(header.split()[0], seq)
+                                  for header, seq in exp[type_]])
+        self.assertIn((249, 249), [(frag.metadata['start'],
+                                    frag.metadata['end'])
+                                   for frag in obs['match']])
+
+    def test_mask_hits_sink(self):
+        out_fp = os.path.join(self.tmpdir, 'frags')
+        exp_fp = os.path.join(self.tmpdir, 'exp')
+        mask_sequence(self.file_out, self.file_fasta, exp_fp, **self.kwargs)
+        obs = mask_hits(self.hits, self.query, subsequences_fp=out_fp,
+                        **self.kwargs)
+        for type_ in ['match', 'non_match']:
+            with open('%s.%s' % (out_fp, type_)) as f_obs, \
+                 open('%s.%s' % (exp_fp, type_)) as f_exp:
+                self.assertEqual(f_obs.read(), f_exp.read())
+
+        # fragments chain into the next stage without a file round-trip
+        split_fasta(obs['non_match'], outdir=self.tmpdir)
+        self.assertTrue(os.path.exists(os.path.join(
+            self.tmpdir, '%s.fasta' % obs['non_match'][0].metadata['id'])))
+
+
+if __name__ == '__main__':
+    main()
@@ -63,4 +63,5 @@ setup(name='microprot',
           'scikit-bio >= 0.4.0',
       ],
       extras_require={'test': ["nose", "pep8", "flake8"],
-                      'coverage': ["coverage"]})
+                      'coverage': ["coverage"],
+                      'parquet': ["pyarrow"]})